@@ -4,11 +4,82 @@
 DEBUG = False
 SECRET_KEY = "secret123"  # Required
 
+# Seconds a login token is valid for
+AUTH_TOKEN_DURATION = 2628000
+# Seconds users are cached when verifying tokens.
+# This is how long revoking tokens or changing the admin flag takes to apply.
+AUTH_CACHE_TTL = 60
+
+# Password hashes are verified on a thread pool of each process, so at most
+# PASSWORD_HASH_WORKERS hashes are computed at once per process. The request
+# waits for its hash, so logins still hold a request worker meanwhile.
+# Logins beyond the queue, or waiting longer than PASSWORD_HASH_TIMEOUT
+# seconds, are rejected with 503.
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_QUEUE = 16
+PASSWORD_HASH_TIMEOUT = 30
+
 
 # https://flask-sqlalchemy.palletsprojects.com/en/2.x/config/#configuration-keys
 SQLALCHEMY_DATABASE_URI = "sqlite:///mcpdb.sqlite"
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 SQLALCHEMY_ECHO = False
+# On postgresql, {"executemany_mode": "values"} lets bulk imports use multi-row VALUES
+# SQLALCHEMY_ENGINE_OPTIONS = {}
+
+# Where downloaded maven artifacts are cached. Defaults to instance/maven
+MAVEN_CACHE_DIR = None
+
+# Rows per executemany batch used by bulk imports
+IMPORT_BATCH_SIZE = 5000
+# Classes per batch. Their ids are looked up using IN, so keep it below the database's parameter limit
+IMPORT_CLASS_BATCH_SIZE = 500
+# Batches buffered between the stages of an import, which bounds its memory use
+IMPORT_QUEUE_SIZE = 4
+
+# Number of versions kept in the in-memory lookup index. 0 disables it
+LOOKUP_CACHE_SIZE = 0
+# Seconds before a cached index is reloaded, which bounds how long changes made
+# by other processes (flask commands, other workers) take to show up
+LOOKUP_CACHE_TTL = 300
+# Names a batch lookup accepts, and how many of them are passed to a single IN (...)
+LOOKUP_MAX_ITEMS = 10000
+LOOKUP_BATCH_SIZE = 500
+# Names a bulk rename accepts
+RENAME_MAX_ITEMS = 1000
+
+# Names a search matches by prefix, and as many by similarity. Their members are all ranked and paged
+SEARCH_MAX_NAMES = 100
+# Share of trigrams a name needs in common with a fuzzy search query
+SEARCH_MIN_SIMILARITY = 0.3
+SEARCH_PAGE_SIZE = 25
+SEARCH_MAX_PAGE_SIZE = 100
+# Longest search query. Each trigram of a fuzzy query is a bound parameter
+SEARCH_MAX_QUERY_LENGTH = 200
+
+# Changes per page of a history
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+
+# Seconds clients and proxies may reuse a response without revalidating it using its ETag.
+# Responses of the latest version change often. Older versions only change when someone renames their members.
+CACHE_MAX_AGE = 0
+CACHE_MAX_AGE_OLD = 86400
+
+# Serve /api/dump from pre-compressed files, rebuilt in the background after names change.
+# Responses are gzip, or zstd if the zstandard package is installed (pip install mcpdb[zstd]).
+# Until a snapshot of the current revision exists, dumps are streamed from the database.
+SNAPSHOTS = True
+# Where snapshots are written. Defaults to instance/snapshots
+SNAPSHOT_DIR = None
+# Seconds without changes to a version before its snapshots are rebuilt, so bursts of renames cause a single rebuild
+SNAPSHOT_DELAY = 30
+# Seconds from the first change after which snapshots are rebuilt anyway, even while renames keep coming
+SNAPSHOT_MAX_DELAY = 300
+SNAPSHOT_ZSTD_LEVEL = 10
+
+# Keep per-version member counts in a table, so the summary doesn't count them on every request
+SUMMARY_STATS = True
 
 GITHUB_CLIENT_ID = None
 GITHUB_CLIENT_SECRET = None
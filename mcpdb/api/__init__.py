@@ -7,7 +7,7 @@ from werkzeug.exceptions import HTTPException, InternalServerError
 bp = Blueprint('api', __name__, url_prefix="/api")
 api = Api(bp)
 
-from . import login, srg, summary
+from . import login, history, srg, summary, lookup, search
 
 __all__ = (
     "api",
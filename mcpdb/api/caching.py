@@ -0,0 +1,106 @@
+import hashlib
+from datetime import datetime
+from functools import wraps, partial
+from typing import Callable, Optional
+
+from flask import request, g, Response
+
+from . import bp
+from .. import app
+from ..models import *
+
+__all__ = (
+    "cached_version",
+    "cached_versions"
+)
+
+
+def _set_cache_headers(etag: str, changed: Optional[datetime], max_age: int):
+    """Remembers the validators of this request. They are added to the response
+    once it's known to be successful, or a 304 is returned if the client already has it."""
+    g.cache_headers = etag, changed, max_age
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and changed is not None:
+        fresh = changed.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        fresh = False
+
+    if fresh:
+        return _add_cache_headers(Response(status=304))
+
+
+def cached_version(f=None, *, variant: Callable[[Versions], Optional[str]] = None):
+    """Makes the responses of a resource cacheable until the version it's for changes.
+
+    The version is taken from the ``version`` parameter like the resources do,
+    or from the ``version`` part of the url.
+    Only the latest version is expected to change often. Others get a longer
+    ``Cache-Control`` lifetime.
+
+    :param variant: Gets what else the bytes of a response depend on, such as
+        its encoding. It's added to the ETag.
+    """
+    if f is None:
+        return partial(cached_version, variant=variant)
+
+    @wraps(f)
+    def decorator(*args, **kwargs):
+        name = kwargs.get('version') or request.values.get('version', 'latest')
+        if name == 'latest':
+            version = Versions.query.filter_by(latest=Active.true).one_or_none()
+        else:
+            version = Versions.query.filter_by(version=name).one_or_none()
+
+        if version is not None:
+            max_age = app.config['CACHE_MAX_AGE'] if version.latest or name == 'latest' \
+                else app.config['CACHE_MAX_AGE_OLD']
+            etag = f'{version.version}-{version.revision}'
+            suffix = variant(version) if variant is not None else None
+            if suffix:
+                etag = f'{etag}-{suffix}'
+            not_modified = _set_cache_headers(etag, version.changed, max_age)
+            if not_modified is not None:
+                return not_modified
+        return f(*args, **kwargs)
+
+    return decorator
+
+
+def cached_versions(f):
+    """Makes the responses of a resource cacheable until any version changes."""
+
+    @wraps(f)
+    def decorator(*args, **kwargs):
+        versions = Versions.query.order_by(Versions.version).all()
+        digest = hashlib.sha1()
+        for v in versions:
+            digest.update(f"{v.version}:{v.revision}:{bool(v.latest)};".encode('utf-8'))
+        changed = max((v.changed for v in versions if v.changed is not None), default=None)
+
+        not_modified = _set_cache_headers(digest.hexdigest()[:16], changed, app.config['CACHE_MAX_AGE'])
+        if not_modified is not None:
+            return not_modified
+        return f(*args, **kwargs)
+
+    return decorator
+
+
+@bp.after_request
+def _add_cache_headers(response: Response):
+    headers = g.pop('cache_headers', None)
+    if headers is None or response.status_code not in (200, 304):
+        return response
+
+    etag, changed, max_age = headers
+    response.set_etag(etag)
+    if changed is not None:
+        response.last_modified = changed
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        # May be stored, but has to be revalidated every time
+        response.cache_control.no_cache = True
+    return response
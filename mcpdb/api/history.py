@@ -0,0 +1,115 @@
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import Tuple
+from urllib.parse import urlencode
+
+from flask import request
+from flask_restplus import Resource, fields, abort
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Query, joinedload
+
+from . import api
+from .. import app
+from ..models import *
+
+__all__ = (
+    "history_model",
+    "history_params",
+    "history_page"
+)
+
+history_model = api.model('History', {
+    'srg_name': fields.String,
+    'mcp_name': fields.String,
+    'changed_by': fields.String(attribute='changed_by.username'),
+    'created': fields.DateTime
+})
+
+user_history_model = api.inherit('User History', history_model, {
+    'member_type': fields.String(attribute=lambda h: h.member_type.value)
+})
+
+history_params = {
+    'limit': f"Changes per page, defaults to {app.config['HISTORY_PAGE_SIZE']}.",
+    'after': 'The cursor of the next page, as given by the Link header.',
+    'since': 'Only changes made at or after this ISO 8601 time, in UTC unless it has an offset.',
+    'until': 'Only changes made before this ISO 8601 time, in UTC unless it has an offset.'
+}
+
+
+def _encode_cursor(change: NameHistory) -> str:
+    return base64.urlsafe_b64encode(f"{change.created.isoformat()}|{change.id}".encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created, change_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return _to_utc(datetime.fromisoformat(created)), int(change_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        abort(400, "Invalid cursor")
+
+
+def _to_utc(value: datetime) -> datetime:
+    """Converts a time with an offset to the naive UTC times stored in the database."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parse_time(name: str):
+    value = request.values.get(name)
+    if value is None:
+        return None
+    try:
+        return _to_utc(datetime.fromisoformat(value))
+    except ValueError:
+        abort(400, f"{name} must be an ISO 8601 time")
+
+
+def history_page(query: Query):
+    """Gets a page of changes, oldest first, from the request parameters.
+
+    Pages are read by keyset on ``(created, id)``, so the indexes ending in those
+    columns serve any page with a single range scan. A ``Link`` header points to
+    the next page while there is one.
+    """
+    try:
+        limit = int(request.values.get('limit', app.config['HISTORY_PAGE_SIZE']))
+    except ValueError:
+        abort(400, "Invalid limit")
+    if not 1 <= limit <= app.config['HISTORY_MAX_PAGE_SIZE']:
+        abort(400, f"limit must be between 1 and {app.config['HISTORY_MAX_PAGE_SIZE']}")
+
+    since, until = _parse_time('since'), _parse_time('until')
+    if since is not None:
+        query = query.filter(NameHistory.created >= since)
+    if until is not None:
+        query = query.filter(NameHistory.created < until)
+    if 'after' in request.values:
+        created, change_id = _decode_cursor(request.values['after'])
+        query = query.filter(or_(NameHistory.created > created,
+                                 and_(NameHistory.created == created, NameHistory.id > change_id)))
+
+    rows = query.options(joinedload(NameHistory.changed_by)) \
+        .order_by(NameHistory.created, NameHistory.id) \
+        .limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, 200, {}
+
+    rows = rows[:limit]
+    args = [(k, v) for k, v in request.args.items(multi=True) if k != 'after']
+    args.append(('after', _encode_cursor(rows[-1])))
+    return rows, 200, {'Link': f'<{request.base_url}?{urlencode(args)}>; rel="next"'}
+
+
+@api.route('/users/<name>/history')
+class UserHistoryResource(Resource):
+    @api.doc(params=history_params, responses={404: "No such user"})
+    @api.marshal_with(user_history_model, as_list=True)
+    def get(self, name):
+        """Lists the names a user set, oldest first."""
+        user = Users.query.filter_by(username=name).one_or_none()
+        if user is None:
+            abort(404, "No such user")
+        return history_page(NameHistory.query.filter_by(changed_by_id=user.id))
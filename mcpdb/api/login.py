@@ -1,4 +1,7 @@
+import time
+from concurrent.futures import TimeoutError
 from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Dict, Tuple
 
 from flask import request, abort, jsonify, g
 from flask_httpauth import HTTPTokenAuth
@@ -7,18 +10,54 @@ from itsdangerous import (TimedJSONWebSignatureSerializer as Serializer, BadSign
 
 from . import api
 from .. import app
-from ..models import Users
+from ..models import Users, ApiKeys
+from ..util import hash_api_key
+from ..util.executor import BoundedExecutor, ExecutorBusy
 
 __all__ = (
     "auth",
+    "AuthUser"
 )
 
 auth = HTTPTokenAuth()
 
+# Built once, it only depends on the app config
+serializer = Serializer(app.config['SECRET_KEY'], expires_in=app.config['AUTH_TOKEN_DURATION'])
 
-def gen_auth_token(user: Users, expiration):
-    s = Serializer(app.config['SECRET_KEY'], expires_in=expiration)
-    return s.dumps({'id': user.id})
+
+class AuthUser(NamedTuple):
+    """The authenticated user, detached from any database session."""
+    id: int
+    username: str
+    admin: bool
+    token_version: int
+
+
+_user_cache: Dict[int, Tuple[float, AuthUser]] = {}
+
+password_executor = BoundedExecutor('password-hash',
+                                    app.config['PASSWORD_HASH_WORKERS'],
+                                    app.config['PASSWORD_HASH_QUEUE'])
+
+
+def gen_auth_token(user: Users):
+    return serializer.dumps({'id': user.id, 'ver': user.token_version})
+
+
+def get_auth_user(user_id: int):
+    """Gets a user by id, caching it for AUTH_CACHE_TTL seconds."""
+    now = time.monotonic()
+    cached = _user_cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    user: Users = Users.query.get(user_id)
+    if user is None:
+        _user_cache.pop(user_id, None)
+        return None
+    auth_user = AuthUser(user.id, user.username, bool(user.admin), user.token_version)
+    _user_cache[user_id] = now + app.config['AUTH_CACHE_TTL'], auth_user
+    return auth_user
 
 
 @auth.error_handler
@@ -28,40 +67,68 @@ def auth_failed():
 
 @auth.verify_token
 def verify_auth_token(token):
-    s = Serializer(app.config['SECRET_KEY'])
     try:
-        data = s.loads(token)
+        data = serializer.loads(token)
     except SignatureExpired:
         # Token good, but expired
         return None
     except BadSignature:
         # Bad token
         return None
-    g.user = Users.query.get(data['id'])
+    user = get_auth_user(data['id'])
+    if user is None or user.token_version != data.get('ver', 0):
+        # Deleted user or revoked token
+        return None
+    g.user = user
     return g.user
 
 
+def check_password(user: Users, password: str) -> bool:
+    """Verifies a password on the password executor, waiting for the result.
+    This bounds how many hashes each process computes at once."""
+    stored = user.password
+    try:
+        return password_executor.run(stored.__eq__, password, timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+    except (ExecutorBusy, TimeoutError):
+        abort(503, "Too many logins, try again later.")
+
+
+def find_api_key_user(key: str):
+    api_key: ApiKeys = ApiKeys.query.filter_by(key_hash=hash_api_key(key)).one_or_none()
+    return api_key and api_key.user
+
+
 @api.route('/login')
 class LoginResource(Resource):
 
+    @api.doc(description="Log in with either a username and password or an api key.",
+             responses={204: "Success", 401: "Bad credentials", 503: "Too many logins at once"})
     @api.expect(api.model('Login', {
         'username': fields.String,
-        'password': fields.String
+        'password': fields.String,
+        'api_key': fields.String
     }))
     def post(self):
-        username = request.json.get('username')
-        password = request.json.get('password')
-        if username is None or password is None:
-            abort(400)
-        user: Users = Users.query.filter_by(username=username).one_or_none()
-        if user is None:
-            abort(401, "Username or password was incorrect.")
-
-        if user.password != password:
-            abort(401, "Username or password was incorrect.")
-
-        duration = 2.628e+6
-        token = gen_auth_token(user, duration)
+        api_key = request.json.get('api_key')
+        if api_key is not None:
+            # Api keys are exchanged for a token without running the kdf
+            user = find_api_key_user(api_key)
+            if user is None:
+                abort(401, "Invalid api key.")
+        else:
+            username = request.json.get('username')
+            password = request.json.get('password')
+            if username is None or password is None:
+                abort(400)
+            user: Users = Users.query.filter_by(username=username).one_or_none()
+            if user is None:
+                abort(401, "Username or password was incorrect.")
+
+            if not check_password(user, password):
+                abort(401, "Username or password was incorrect.")
+
+        duration = app.config['AUTH_TOKEN_DURATION']
+        token = gen_auth_token(user)
 
         delta = timedelta(seconds=duration)
         exp_date = datetime.utcnow() + delta
@@ -73,6 +140,17 @@ class LoginResource(Resource):
         }
 
 
+@api.route('/login/metrics')
+class LoginMetricsResource(Resource):
+    @auth.login_required
+    @api.doc(responses={403: "When the user isn't an admin"})
+    def get(self):
+        """Queue metrics of the password executor"""
+        if not g.user.admin:
+            abort(403)
+        return password_executor.metrics()
+
+
 @api.route('/testtoken')
 class TestResource(Resource):
     @auth.login_required
@@ -0,0 +1,244 @@
+from typing import Dict, List, Optional, Tuple
+
+from flask import request
+from flask_restplus import Resource, fields, abort, marshal
+from sqlalchemy import select
+
+from . import api
+from .srg import base_model, field_model, method_model, param_model, eager_options
+from .. import app, db
+from ..models import *
+from ..util import split_class_name
+from ..util.bulk import chunked
+from ..util.cache import lookup_cache, VersionIndex
+
+__all__ = ()
+
+lookup_types = {
+    'class': (Classes, base_model),
+    'field': (Fields, field_model),
+    'method': (Methods, method_model),
+    'param': (Parameters, param_model)
+}
+
+lookup_item_model = api.model('Lookup Item', {
+    'type': fields.String(required=True, enum=list(lookup_types)),
+    'name': fields.String(required=True),
+    'version': fields.String(description='The Minecraft Version, defaults to the version parameter, then latest.')
+})
+
+
+class LookupItem:
+    """One name of a batch lookup, and what it resolved to."""
+
+    __slots__ = ('type', 'name', 'version', 'class_name', 'class_id', 'ids', 'results', 'error')
+
+    def __init__(self, type: str, name: str, version: Optional[str]):
+        self.type = type
+        self.name = name
+        self.version = version
+        self.class_name: Optional[str] = None
+        self.class_id: Optional[int] = None
+        self.ids: List[int] = []
+        self.results: List[SrgNamed] = []
+        self.error: Optional[str] = None
+
+
+def _in_chunks(column, values):
+    """Yields IN clauses of at most ``LOOKUP_BATCH_SIZE`` values each."""
+    for chunk in chunked(sorted(set(values)), app.config['LOOKUP_BATCH_SIZE']):
+        yield column.in_(chunk)
+
+
+def _resolve_versions(items: List[LookupItem]):
+    default = request.values.get('version', 'latest')
+    if lookup_cache.enabled:
+        resolve = lookup_cache.resolve_version
+    else:
+        rows = db.session.query(Versions.version, Versions.latest).all()
+        latest = next((v for v, l in rows if l), None)
+        versions = {v for v, _ in rows}
+
+        def resolve(version):
+            if version == 'latest':
+                return latest
+            return version if version in versions else None
+
+    resolved = {name: resolve(name) for name in {item.version or default for item in items}}
+    for item in items:
+        item.version = resolved[item.version or default]
+        if item.version is None:
+            item.error = "No such version"
+
+
+def _split_names(items: List[LookupItem]):
+    for item in items:
+        if item.type == 'class':
+            item.class_name = item.name
+        elif '.' in item.name:
+            if item.type == 'param':
+                item.error = "Parameters cannot be filtered by class"
+                continue
+            item.class_name = item.name[:item.name.rfind('.')]
+            item.name = item.name[item.name.rfind('.') + 1:]
+
+
+def _cached_indexes(items: List[LookupItem]) -> Dict[str, VersionIndex]:
+    return {version: lookup_cache.get(version) for version in {item.version for item in items}}
+
+
+def _find_classes_cached(items: List[LookupItem]) -> Dict[Tuple[str, str], List[int]]:
+    indexes = _cached_indexes(items)
+    return {(item.version, item.class_name): indexes[item.version].find_classes(item.class_name)
+            for item in items}
+
+
+def _find_classes(items: List[LookupItem]) -> Dict[Tuple[str, str], List[int]]:
+    """Finds the classes by obf name, then by srg name using the simple name."""
+    c = Classes.__table__
+    versions = {item.version for item in items}
+    wanted = {(item.version, item.class_name) for item in items}
+
+    by_obf: Dict[Tuple[str, str], List[int]] = {}
+    for clause in _in_chunks(c.c.obf_name, (name for _, name in wanted)):
+        for cid, version, obf in db.session.execute(
+                select([c.c.id, c.c.version, c.c.obf_name]).where(c.c.version.in_(versions)).where(clause)):
+            by_obf.setdefault((version, obf), []).append(cid)
+
+    found = {key: by_obf[key] for key in wanted if key in by_obf}
+    missing = wanted - found.keys()
+    simple_names = {split_class_name(name)[1] for _, name in missing}
+    by_simple_name: Dict[Tuple[str, str], List[Tuple[int, str]]] = {}
+    for clause in _in_chunks(c.c.simple_name, simple_names):
+        for cid, version, srg, simple_name in db.session.execute(
+                select([c.c.id, c.c.version, c.c.srg_name, c.c.simple_name])
+                        .where(c.c.version.in_(versions)).where(clause)):
+            by_simple_name.setdefault((version, simple_name), []).append((cid, srg))
+
+    for version, name in missing:
+        candidates = by_simple_name.get((version, split_class_name(name)[1]), ())
+        found[version, name] = [cid for cid, srg in candidates if srg == name or srg.endswith('.' + name)]
+    return found
+
+
+def _resolve_classes(items: List[LookupItem]):
+    items = [item for item in items if item.class_name is not None and item.error is None]
+    if not items:
+        return
+    found = _find_classes_cached(items) if lookup_cache.enabled else _find_classes(items)
+    for item in items:
+        classes = found[item.version, item.class_name]
+        if not classes:
+            item.error = "Unknown class"
+        elif len(classes) > 1:
+            item.error = "Ambiguous class name"
+        elif item.type == 'class':
+            item.ids = classes
+        else:
+            item.class_id, = classes
+
+
+def _find_members_cached(table: McpNamedTable, items: List[LookupItem]):
+    indexes = _cached_indexes(items)
+    for item in items:
+        item.ids = indexes[item.version].tables[table].find(item.name, item.class_id)
+
+
+def _find_members(table: McpNamedTable, items: List[LookupItem]):
+    """Looks up the names using the same fallbacks as a single lookup: the srg id
+    for numbers, otherwise the srg name, obf name and then the mcp name.
+    Each kind of name takes one query for every item, or a few for very large batches."""
+    t = table.__table__
+    owner = t.c.method_id if table is Parameters else t.c.class_id
+    versions = {item.version for item in items}
+
+    def match(pending: List[LookupItem], column, key):
+        if not pending:
+            return []
+        rows: Dict[tuple, List[Tuple[int, int]]] = {}
+        for clause in _in_chunks(column, (key(item) for item in pending)):
+            query = select([t.c.id, owner, t.c.version, column]) \
+                .where(t.c.version.in_(versions)).where(clause).order_by(t.c.id)
+            for mid, owner_id, version, name in db.session.execute(query):
+                rows.setdefault((version, name), []).append((mid, owner_id))
+
+        missed = []
+        for item in pending:
+            item.ids = [mid for mid, owner_id in rows.get((item.version, key(item)), ())
+                        if item.class_id is None or owner_id == item.class_id]
+            if not item.ids:
+                missed.append(item)
+        return missed
+
+    by_id, by_name = [], []
+    for item in items:
+        (by_id if table is not Parameters and _srg_id(item.name) is not None else by_name).append(item)
+
+    if by_id:
+        match(by_id, t.c.srg_id, lambda item: _srg_id(item.name))
+    missed = match(by_name, t.c.srg_name, lambda item: item.name)
+    missed = match(missed, t.c.obf_name, lambda item: item.name)
+    match(missed, t.c.mcp_name, lambda item: item.name)
+
+
+def _srg_id(name: str) -> Optional[int]:
+    try:
+        return int(name)
+    except ValueError:
+        return None
+
+
+def _load(table: SrgNamedTable, ids) -> Dict[int, SrgNamed]:
+    loaded = {}
+    for clause in _in_chunks(table.id, ids):
+        for row in table.query.options(*eager_options[table]).filter(clause):
+            loaded[row.id] = row
+    return loaded
+
+
+def lookup(items: List[LookupItem]):
+    """Resolves the items in place with a fixed number of queries for each type."""
+    _resolve_versions(items)
+    _split_names(items)
+    _resolve_classes(items)
+
+    for type_name, (table, _) in lookup_types.items():
+        of_type = [item for item in items if item.type == type_name and item.error is None]
+        if table is not Classes and of_type:
+            if lookup_cache.enabled:
+                _find_members_cached(table, of_type)
+            else:
+                _find_members(table, of_type)
+
+        loaded = _load(table, [i for item in of_type for i in item.ids])
+        for item in of_type:
+            if not item.ids:
+                item.error = "Mapping not found"
+            item.results = [loaded[i] for i in sorted(item.ids)]
+
+
+@api.route('/lookup')
+class LookupResource(Resource):
+    @api.doc(params={'version': 'The default Minecraft Version of the items, defaults to latest.'},
+             responses={400: "When too many names are passed"})
+    @api.expect([lookup_item_model], validate=True)
+    def post(self):
+        """Looks up many names at once.
+
+        Results are returned in the same order as the items. Items which
+        can't be resolved have an error message instead of results.
+        """
+        data = request.json
+        if len(data) > app.config['LOOKUP_MAX_ITEMS']:
+            abort(400, f"At most {app.config['LOOKUP_MAX_ITEMS']} names can be looked up at once")
+
+        items = [LookupItem(d['type'], d['name'], d.get('version')) for d in data]
+        lookup(items)
+
+        return [{
+            'type': item.type,
+            'name': d['name'],
+            'version': item.version,
+            'results': None if item.error else marshal(item.results, lookup_types[item.type][1]),
+            'error': item.error
+        } for d, item in zip(data, items)]
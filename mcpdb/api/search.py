@@ -0,0 +1,117 @@
+from typing import Dict, List, Tuple
+
+from flask import request
+from flask_restplus import Resource, abort, marshal
+from sqlalchemy import select
+
+from . import api
+from .caching import cached_version
+from .lookup import lookup_types
+from .srg import eager_options
+from .. import app, db
+from ..models import *
+from ..util import get_version
+from ..util.bulk import chunked
+from ..util.search import SearchMatch, find_names
+
+__all__ = ()
+
+# Which columns of each table are searched, and what kind of name they hold
+search_columns = {
+    Classes: (('srg_name', 'srg'), ('simple_name', 'srg'), ('obf_name', 'obf')),
+    Fields: (('srg_name', 'srg'), ('obf_name', 'obf'), ('mcp_name', 'mcp')),
+    Methods: (('srg_name', 'srg'), ('obf_name', 'obf'), ('mcp_name', 'mcp')),
+    Parameters: (('srg_name', 'srg'), ('obf_name', 'obf'), ('mcp_name', 'mcp'))
+}
+
+# The rank of the matched name, the member id, the name and the kind of name
+Hit = Tuple[int, int, str, str]
+
+
+def _find_members(table: SrgNamedTable, version: str, matches: List[SearchMatch]) -> List[Hit]:
+    """Finds the members having any of the names, each with the best name it matched by."""
+    t = table.__table__
+    rank = {m.name: i for i, m in enumerate(matches)}
+    best: Dict[int, Hit] = {}
+    for column, kind in search_columns[table]:
+        column = t.c[column]
+        for chunk in chunked(rank, app.config['LOOKUP_BATCH_SIZE']):
+            query = select([t.c.id, column]).where(t.c.version == version).where(column.in_(chunk))
+            for mid, name in db.session.execute(query):
+                hit = (rank[name], mid, name, kind)
+                if mid not in best or hit < best[mid]:
+                    best[mid] = hit
+    return list(best.values())
+
+
+@api.route('/search')
+class SearchResource(Resource):
+    @api.doc(params={
+        'q': f"The start of a srg, obf or mcp name, at most {app.config['SEARCH_MAX_QUERY_LENGTH']} characters. "
+             "Case insensitive.",
+        'fuzzy': 'Also finds names similar to q, to allow for typos.',
+        'type': 'Only searches one of class, field, method or param.',
+        'version': 'The Minecraft Version, defaults to latest.',
+        'page': 'The page of results, starting at 1.',
+        'per_page': f"Results per page, defaults to {app.config['SEARCH_PAGE_SIZE']}."
+    }, responses={400: "When the query or paging is invalid", 404: "When the version doesn't exist"})
+    @cached_version
+    def get(self):
+        """Searches names by prefix, or by similarity.
+
+        Results are ranked by how well the name matches: exact matches come
+        first, then names starting with the query, then similar names.
+        Only the best matching names are searched, so ``total`` is a lower
+        bound when ``has_more`` is set. A longer query narrows it down.
+        """
+        query = request.values.get('q', '').strip()
+        if not query:
+            abort(400, "A query is required")
+        if len(query) > app.config['SEARCH_MAX_QUERY_LENGTH']:
+            abort(400, f"The query can be at most {app.config['SEARCH_MAX_QUERY_LENGTH']} characters")
+
+        version = get_version(request.values.get('version', 'latest'))
+        if version is None:
+            abort(404, "No such version")
+
+        type_name = request.values.get('type')
+        if type_name is not None and type_name not in lookup_types:
+            abort(400, "Unknown type")
+        types = [type_name] if type_name is not None else list(lookup_types)
+
+        try:
+            page = int(request.values.get('page', 1))
+            per_page = int(request.values.get('per_page', app.config['SEARCH_PAGE_SIZE']))
+        except ValueError:
+            abort(400, "Invalid page")
+        if page < 1 or not 1 <= per_page <= app.config['SEARCH_MAX_PAGE_SIZE']:
+            abort(400, f"per_page must be between 1 and {app.config['SEARCH_MAX_PAGE_SIZE']}")
+
+        columns = [table.__table__.c[column] for table in (lookup_types[name][0] for name in types)
+                   for column, _ in search_columns[table]]
+        matches, has_more = find_names(query, 'fuzzy' in request.values, version.version, columns)
+        hits = [(name, hit) for name in types for hit in _find_members(lookup_types[name][0], version.version, matches)]
+        hits.sort(key=lambda h: (h[1][0], types.index(h[0]), h[1][1]))
+        results = hits[(page - 1) * per_page:page * per_page]
+
+        loaded = {}
+        for name in {name for name, _ in results}:
+            table = lookup_types[name][0]
+            ids = [hit[1] for n, hit in results if n == name]
+            loaded.update({(name, row.id): row for row in
+                           table.query.options(*eager_options[table]).filter(table.id.in_(ids))})
+
+        return {
+            'total': len(hits),
+            'has_more': has_more,
+            'page': page,
+            'per_page': per_page,
+            'results': [{
+                'type': name,
+                'name': matched,
+                'name_type': kind,
+                'match': matches[rank].kind,
+                'score': round(matches[rank].score, 3),
+                'result': marshal(loaded[name, mid], lookup_types[name][1])
+            } for name, (rank, mid, matched, kind) in results]
+        }
@@ -1,14 +1,22 @@
 import string
+from datetime import datetime
 
 import sqlalchemy.orm.exc
 from flask import request, g
 from flask_restplus import Resource, fields, abort
+from sqlalchemy import select, bindparam, literal
+from sqlalchemy.orm import joinedload, selectinload
 
 from . import api
-from .login import auth
-from .. import db
+from .caching import cached_version, cached_versions
+from .history import history_model, history_params, history_page
+from .login import auth, AuthUser
+from .. import app, db
 from ..models import *
 from ..util import *
+from ..util import stats, snapshots, search
+from ..util.bulk import chunked, insert_returning_ids
+from ..util.cache import lookup_cache, VersionIndex
 
 __all__ = ()
 
@@ -19,7 +27,7 @@ base_model = api.model('Srg Named', {
 })
 
 field_model = api.inherit('Field', base_model, {
-    'mcp_name': fields.String(attribute='last_change.mcp_name'),
+    'mcp_name': fields.String,
     'owner': fields.String(attribute='owner.srg_name'),
     'locked': fields.Boolean
 })
@@ -32,21 +40,32 @@ method_model = api.inherit('Method', field_model, {
     'parameters': fields.Nested(param_model)
 })
 
-history_model = api.model('History', {
-    'srg_name': fields.String,
-    'mcp_name': fields.String,
-    'changed_by': fields.String(attribute='changed_by.username'),
-    'created': fields.DateTime
-})
+# Loads every relationship used by the marshal models up front,
+# so a lookup costs the same number of queries no matter how many rows match.
+eager_options = {
+    Classes: (),
+    Fields: (
+        joinedload(Fields.owner),
+    ),
+    Methods: (
+        joinedload(Methods.owner),
+        selectinload(Methods.parameters)
+    ),
+    Parameters: (
+        joinedload(Parameters.owner),
+    )
+}
 
 
 def get_srg_name(table: SrgNamedTable, name: str):
-    version = get_version(request.values.get('version', 'latest'))
+    if lookup_cache.enabled:
+        version = lookup_cache.resolve_version(request.values.get('version', 'latest'))
+    else:
+        version = get_version(request.values.get('version', 'latest'))
+        version = version and version.version
     if version is None:
         abort(404, "No such version")
 
-    version = version.version
-
     class_name = None
     if table is Classes:
         class_name = name
@@ -56,6 +75,9 @@ def get_srg_name(table: SrgNamedTable, name: str):
         class_name = name[:name.rfind('.')]
         name = name[name.rfind('.') + 1:]
 
+    if lookup_cache.enabled:
+        return _get_cached_srg_name(lookup_cache.get(version), table, class_name, name)
+
     search = {'version': version}
 
     if class_name:
@@ -65,9 +87,13 @@ def get_srg_name(table: SrgNamedTable, name: str):
             # First, try the obf name.
             class_info = Classes.query.filter_by(version=version, obf_name=class_name).one_or_none()
             if class_info is None:
-                # Missed, so try for the srg name
-                class_info = Classes.query.filter(Classes.version == version,
-                                                  Classes.srg_name.endswith("." + class_name)).one_or_none()
+                # Missed, so try for the srg name, using the simple name to narrow it down
+                _, simple_name = split_class_name(class_name)
+                candidates = [c for c in Classes.query.filter_by(version=version, simple_name=simple_name)
+                              if c.srg_name == class_name or c.srg_name.endswith("." + class_name)]
+                if len(candidates) > 1:
+                    raise sqlalchemy.orm.exc.MultipleResultsFound
+                class_info = candidates[0] if candidates else None
             # reeee, the class doesn't exist!
             if class_info is None:
                 abort(404, "Unknown class")
@@ -82,18 +108,19 @@ def get_srg_name(table: SrgNamedTable, name: str):
             search['class_id'] = class_info.id
 
     info: SrgNamed
+    query = table.query.options(*eager_options[table])
 
     try:
-        info = table.query.filter_by(srg_id=int(name), **search).all()
+        info = query.filter_by(srg_id=int(name), **search).all()
     except ValueError:
         # search by srg
-        info = table.query.filter_by(srg_name=name, **search).all()
+        info = query.filter_by(srg_name=name, **search).all()
         if not info:
             # search by obf
-            info = table.query.filter_by(obf_name=name, **search).all()
+            info = query.filter_by(obf_name=name, **search).all()
         if not info:
             # search by mcp
-            info = table.query.filter_by(**search).join(NameHistory).filter(NameHistory.mcp_name == name).all()
+            info = query.filter_by(mcp_name=name, **search).all()
 
     if not info:
         raise abort(404, "Mapping not found")
@@ -101,10 +128,32 @@ def get_srg_name(table: SrgNamedTable, name: str):
     return info
 
 
+def _get_cached_srg_name(index: VersionIndex, table: SrgNamedTable, class_name, name):
+    class_id = None
+    if class_name:
+        classes = index.find_classes(class_name)
+        if not classes:
+            abort(404, "Unknown class")
+        if len(classes) > 1:
+            abort(404, "Ambiguous class name")
+        class_id, = classes
+        if table is Classes:
+            return Classes.query.get(class_id)
+
+    ids = index.tables[table].find(name, class_id)
+    if not ids:
+        raise abort(404, "Mapping not found")
+
+    return table.query.options(*eager_options[table]).filter(table.id.in_(ids)).order_by(table.id).all()
+
+
 valid_member_chars = string.ascii_letters + string.digits + "_$"
 
 
-@auth.login_required
+def is_valid_member_name(name: str):
+    return bool(name) and all(c in valid_member_chars for c in name) and name[0] not in string.digits
+
+
 def set_srg_name(table: McpNamedTable, name: str):
     version = get_version(request.values.get('version', 'latest'))
     if version is None:
@@ -117,11 +166,10 @@ def set_srg_name(table: McpNamedTable, name: str):
     except KeyError:
         raise abort(400)
 
-    filtered = ''.join(c for c in mcp if c in valid_member_chars)
-    if mcp != filtered or mcp[0] in string.digits:
+    if not is_valid_member_name(mcp):
         raise abort(400, "Illegal member name")
 
-    user: Users = g.user
+    user: AuthUser = g.user
 
     if force and not user.admin:
         raise abort(403)
@@ -133,23 +181,176 @@ def set_srg_name(table: McpNamedTable, name: str):
     if info.locked and not force:
         raise abort(403)
 
-    if info.last_change is not None and info.last_change.mcp_name == mcp:
+    if info.mcp_name == mcp:
         abort(400, 'MCP Name already is already set')
 
+    stats.count_rename(info)
     info.last_change = NameHistory(
         member_type=table.member_type,
         srg_name=name,
         mcp_name=mcp,
-        changed_by=user
+        changed_by_id=user.id
     )
+    info.mcp_name = mcp
+    bump_revision(version)
+    search.index_names([mcp])
 
     db.session.commit()
+    lookup_cache.renamed(info, mcp)
+    lookup_cache.revised(version)
+    snapshots.builder.schedule(version)
 
     return info, 201
 
 
+rename_tables = {
+    'field': Fields,
+    'method': Methods,
+    'param': Parameters
+}
+
+rename_model = api.model('Rename', {
+    'type': fields.String(required=True, enum=list(rename_tables)),
+    'srg_name': fields.String(required=True),
+    'mcp_name': fields.String(required=True),
+    'force': fields.Boolean(default=False)
+})
+
+rename_result_model = api.model('Rename Result', {
+    'type': fields.String,
+    'srg_name': fields.String,
+    'mcp_name': fields.String,
+    'status': fields.Integer(description='The status a single PUT would have returned'),
+    'message': fields.String
+})
+
+
+def set_srg_names(entries):
+    """Applies many renames in one transaction, using the same rules as ``set_srg_name``.
+    Entries which break a rule are skipped and get the error status, the rest are applied."""
+    version = get_version(request.values.get('version', 'latest'))
+    if version is None:
+        raise abort(404, "No such version")
+    version = version.version
+
+    if len(entries) > app.config['RENAME_MAX_ITEMS']:
+        raise abort(400, f"At most {app.config['RENAME_MAX_ITEMS']} names can be set at once")
+
+    user: AuthUser = g.user
+    results = [{
+        'type': e['type'],
+        'srg_name': e['srg_name'],
+        'mcp_name': e['mcp_name'],
+        'status': 201,
+        'message': None
+    } for e in entries]
+
+    def fail(i, status, message):
+        results[i]['status'] = status
+        results[i]['message'] = message
+
+    pending = {table: [] for table in rename_tables.values()}
+    seen = set()
+    for i, e in enumerate(entries):
+        key = e['type'], e['srg_name']
+        if not is_valid_member_name(e['mcp_name']):
+            fail(i, 400, "Illegal member name")
+        elif e.get('force') and not user.admin:
+            fail(i, 403, "Only admins can force names")
+        elif key in seen:
+            fail(i, 400, "Duplicate entry")
+        else:
+            seen.add(key)
+            pending[rename_tables[e['type']]].append(i)
+
+    conn = db.session.connection()
+    # (table, entry index, member row)
+    accepted = []
+    for table, indexes in pending.items():
+        t = table.__table__
+        owner = t.c.method_id if table is Parameters else t.c.class_id
+        counted = literal(True) if table is Parameters else t.c.srg_id != None
+        members = {}
+        for chunk in chunked(sorted({entries[i]['srg_name'] for i in indexes}), app.config['LOOKUP_BATCH_SIZE']):
+            query = select([t.c.id, owner.label('owner_id'), t.c.srg_name, t.c.locked, t.c.last_change_id,
+                            counted.label('counted'), t.c.mcp_name]) \
+                .where(t.c.version == version) \
+                .where(t.c.srg_name.in_(chunk))
+            for row in conn.execute(query):
+                members.setdefault(row.srg_name, []).append(row)
+
+        for i in indexes:
+            e = entries[i]
+            rows = members.get(e['srg_name'], ())
+            if not rows:
+                fail(i, 404, "Mapping not found")
+            elif len(rows) > 1:
+                fail(i, 400, "Ambiguous srg name")
+            elif rows[0].locked and not e.get('force'):
+                fail(i, 403, "Member is locked")
+            elif rows[0].mcp_name == e['mcp_name']:
+                fail(i, 400, "MCP Name already is already set")
+            else:
+                accepted.append((table, i, rows[0]))
+
+    if accepted:
+        h = NameHistory.__table__
+        now = datetime.utcnow()
+        history = ({
+            'member_type': table.member_type,
+            'srg_name': row.srg_name,
+            'mcp_name': entries[i]['mcp_name'],
+            'changed_by_id': user.id,
+            'created': now,
+            'updated': now
+        } for table, i, row in accepted)
+        change_ids = insert_returning_ids(conn, h, history, ('member_type', 'srg_name', 'mcp_name'),
+                                          app.config['IMPORT_BATCH_SIZE'])
+
+        for table in pending:
+            renamed = [(i, row, cid) for (t, i, row), cid in zip(accepted, change_ids) if t is table]
+            if not renamed:
+                continue
+            t = table.__table__
+            conn.execute(t.update().where(t.c.id == bindparam('_id'))
+                         .values(last_change_id=bindparam('_change_id'), mcp_name=bindparam('_mcp_name'),
+                                 updated=now),
+                         [{'_id': row.id, '_change_id': cid, '_mcp_name': entries[i]['mcp_name']}
+                          for i, row, cid in renamed])
+            stats.count_renames(version, table.member_type,
+                                sum(1 for _, row, _ in renamed if row.last_change_id is None and row.counted))
+        bump_revision(version)
+        search.index_names(entries[i]['mcp_name'] for _, i, _ in accepted)
+
+    db.session.commit()
+    for table, i, row in accepted:
+        lookup_cache.renamed_entry(table, version, (row.id, row.owner_id), entries[i]['mcp_name'])
+    if accepted:
+        lookup_cache.revised(version)
+        snapshots.builder.schedule(version)
+
+    return results
+
+
+@api.route('/names')
+class NamesResource(Resource):
+    @auth.login_required
+    @api.doc(params={'version': 'The Minecraft Version, defaults to latest.'},
+             responses={400: "When too many names are passed"})
+    @api.expect([rename_model], validate=True)
+    @api.marshal_with(rename_result_model, as_list=True)
+    def put(self):
+        """Sets many names at once.
+
+        Each entry is checked like a single PUT, and gets the status it would
+        have returned. The valid entries are applied together.
+        """
+        return set_srg_names(request.json)
+
+
 @api.route('/versions')
 class VersionResource(Resource):
+    @cached_versions
     @api.marshal_with(api.model('Version', {
         'latest': fields.String,
         'versions': fields.List(fields.String)
@@ -167,6 +368,7 @@ class VersionResource(Resource):
 class ClassResource(Resource):
     srg_type: McpNamed
 
+    @cached_version
     @api.doc(params={'version': 'The Minecraft Version, defaults to latest.'},
              responses={404: "No name found or ambiguous class"})
     @api.marshal_with(base_model)
@@ -178,10 +380,12 @@ def _init_resources():
     def init(endpoint_name, table, get_model):
         @api.route(f"/{endpoint_name}/<name>")
         class BaseResource(Resource):
+            @cached_version
             @api.marshal_with(get_model, as_list=True)
             def get(self, name):
                 return get_srg_name(table, name)
 
+            @auth.login_required
             @api.doc(responses={
                 204: "Success",
                 400: "When bad parameters are passed",
@@ -191,14 +395,20 @@ def _init_resources():
                 'mcp_name': fields.String,
                 'force': fields.Boolean
             }), validate=True)
+            @api.marshal_with(get_model, code=201)
             def put(self, name):
                 return set_srg_name(table, name)
 
         @api.route(f"/{endpoint_name}/<name>/history")
         class HistoryResource(Resource):
+            @api.doc(params=dict(history_params, user='Only changes made by this user.'))
             @api.marshal_with(history_model, as_list=True)
             def get(self, name):
-                return NameHistory.query.filter_by(member_type=MemberType(endpoint_name), srg_name=name).all()
+                query = NameHistory.query.filter_by(member_type=table.member_type, srg_name=name)
+                if 'user' in request.values:
+                    query = query.join(Users, NameHistory.changed_by_id == Users.id) \
+                        .filter(Users.username == request.values['user'])
+                return history_page(query)
 
     for n, t, m in [("field", Fields, field_model),
                     ("method", Methods, method_model),
@@ -1,59 +1,127 @@
-from flask import request
-from flask_restplus import Resource, fields
+import os
+from typing import Optional, Tuple
+
+from flask import request, Response, stream_with_context
+from flask_restplus import Resource, abort
+from werkzeug.wsgi import wrap_file
 
 from . import api
+from .caching import cached_version
+from .. import app
 from ..models import *
-from ..util import get_version
-
-dump_model = api.model("Dump", {
-    'srg_name': fields.String,
-    'mcp_name': fields.String(attribute='last_change.mcp_name')
-})
-dump_doc_model = api.inherit("Dump+Docs", dump_model, {
-    'comment': fields.String
-})
+from ..util import get_version, dump, stats, snapshots
 
 
 @api.route('/summary')
 class SummaryResource(Resource):
+    @cached_version
     def get(self):
-        version = get_version(request.values.get('version', 'latest')).version
+        version = get_version(request.values.get('version', 'latest'))
+        if version is None:
+            abort(404, "No such version")
 
-        def compute(table):
-            result = table.query.filter_by(version=version)
+        counts = stats.get_stats(version.version)
 
-            if table is not Parameters:
-                result = result.filter(table.srg_id != None)
-
-            total = result.count()
-            unmapped = result.filter_by(last_change=None).count()
-            mapped = total - unmapped
+        def compute(member_type):
+            total, mapped = counts.get(member_type, (0, 0))
             return dict(
                 total=total,
                 mapped=mapped,
-                unmapped=unmapped
+                unmapped=total - mapped
             )
 
         return dict(
-            fields=compute(Fields),
-            methods=compute(Methods),
-            params=compute(Parameters)
+            fields=compute(MemberType.field),
+            methods=compute(MemberType.method),
+            params=compute(MemberType.parameter)
         )
 
 
+def _dump_variant() -> Optional[str]:
+    """The snapshot of the requested dump, or None if the parameters are invalid."""
+    fmt = request.values.get('format', 'json')
+    table = request.values.get('table')
+    if fmt not in dump.DUMP_FORMATS or (fmt == 'csv' and table not in dump.DUMP_TABLES):
+        return None
+    return snapshots.variant_name(fmt, table, doc='nodoc' not in request.values)
+
+
+def _find_snapshot(version: Versions) -> Optional[Tuple[str, Optional[str]]]:
+    """Finds the snapshot of the requested dump and the best encoding the client accepts.
+    The encoding is None if it doesn't accept any, so the gzip file has to be decompressed."""
+    variant = _dump_variant()
+    if not app.config['SNAPSHOTS'] or variant is None:
+        return None
+    encoding = request.accept_encodings.best_match(list(snapshots.ENCODINGS))
+    path = snapshots.snapshot_path(version, variant, encoding or 'gzip')
+    return (path, encoding) if path is not None else None
+
+
+def _dump_encoding(version: Versions) -> Optional[str]:
+    snapshot = _find_snapshot(version)
+    return snapshot[1] if snapshot is not None else None
+
+
 @api.route('/dump')
 class SummaryDetailResource(Resource):
+    @api.doc(params={
+        'version': 'The Minecraft Version, defaults to latest.',
+        'format': 'One of json, ndjson or csv, defaults to json.',
+        'table': 'The table to export when using csv. One of fields, methods or params.',
+        'nodoc': 'Leaves out the comments when using json.'
+    })
+    @cached_version(variant=_dump_encoding)
     def get(self):
-        version = get_version(request.values.get('version', 'latest')).version
-        nodoc = 'nodoc' in request.values
+        """Exports the mcp names of a version.
 
-        m = dump_model if nodoc else dump_doc_model
+        Dumps are sent compressed with gzip or zstd when the client accepts it.
+        """
+        v = get_version(request.values.get('version', 'latest'))
+        if v is None:
+            abort(404, "No such version")
+        version = v.version
 
-        def compute(table):
-            return table.query.filter_by(version=version).filter(table.last_change != None).all()
+        fmt = request.values.get('format', 'json')
+        if fmt not in dump.DUMP_FORMATS:
+            abort(400, "Unknown format")
 
-        return dict(
-            fields=api.marshal(compute(Fields), m),
-            methods=api.marshal(compute(Methods), m),
-            params=api.marshal(compute(Parameters), m)
-        )
+        if fmt == 'csv':
+            table = request.values.get('table')
+            if table not in dump.DUMP_TABLES:
+                abort(400, "The csv format requires a table")
+            body = dump.dump_csv(version, table)
+        elif fmt == 'ndjson':
+            body = dump.dump_ndjson(version)
+        else:
+            body = dump.dump_json(version, doc='nodoc' not in request.values)
+
+        mimetype = dump.DUMP_FORMATS[fmt]
+        snapshot = _find_snapshot(v)
+        if snapshot is None:
+            snapshots.builder.schedule(version, reset=False)
+            response = Response(stream_with_context(body), mimetype=mimetype)
+        elif snapshot[1] is None:
+            response = Response(snapshots.read_decompressed(snapshot[0]), mimetype=mimetype)
+        else:
+            path, encoding = snapshot
+            f = open(path, 'rb')
+            response = Response(wrap_file(request.environ, f), mimetype=mimetype, direct_passthrough=True)
+            response.content_length = os.fstat(f.fileno()).st_size
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+@api.route('/export/<version>.zip')
+class ExportResource(Resource):
+    @api.doc(params={'version': 'The Minecraft Version, or latest.'}, responses={404: "No such version"})
+    @cached_version
+    def get(self, version):
+        """Exports the mcp names of a version as an mcp_snapshot zip."""
+        v = get_version(version)
+        if v is None:
+            abort(404, "No such version")
+
+        response = Response(stream_with_context(dump.dump_mcp_zip(v.version)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename="mcp_snapshot-{v.version}.zip"'
+        return response
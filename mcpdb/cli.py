@@ -1,11 +1,22 @@
+import os
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Tuple
+
 import click
+from sqlalchemy import select, inspect, bindparam, func, literal, exists, and_, Column, Integer, Text, DateTime
 
 from . import app, db, util
 from .models import *
-from .util import mcp, tsrg, maven
+from .util import mcp, tsrg, maven, stats, snapshots, search, dump
+from .util.bulk import chunked, insert_batched, insert_select_returning_ids, temporary_table, Throughput, Phases
+from .util.pipeline import Pipeline
 
 __all__ = ()
 
+maven.cache = maven.ArtifactCache(app.config['MAVEN_CACHE_DIR'] or os.path.join(app.instance_path, 'maven'))
+
 
 def check_loaded_version(version):
     if not util.get_version(version):
@@ -20,6 +31,75 @@ def execute(statement):
         click.echo(s)
 
 
+@app.cli.command()
+def upgrade_schema():
+    """Creates any missing tables, columns and indexes on an existing database
+    and fills in the new columns."""
+    db.create_all()
+    inspector = inspect(db.engine)
+    for table in db.Model.metadata.sorted_tables:
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                click.echo(f"Adding column {table.name}.{column.name}... ", nl=False)
+                col_def = f"{column.name} {column.type.compile(dialect=db.engine.dialect)}"
+                if column.server_default is not None:
+                    col_def += f" DEFAULT '{column.server_default.arg}'"
+                db.engine.execute(f"ALTER TABLE {table.name} ADD COLUMN {col_def}")
+                click.echo("Done")
+
+        existing = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                click.echo(f"Creating index {index.name}... ", nl=False)
+                index.create(db.engine)
+                click.echo("Done")
+
+    backfill_class_names()
+    backfill_mcp_names()
+    backfill_search_index()
+
+
+def backfill_class_names():
+    c = Classes.__table__
+    rows = db.engine.execute(select([c.c.id, c.c.srg_name]).where(c.c.simple_name == None)).fetchall()
+    if not rows:
+        return
+    click.echo(f"Splitting {len(rows)} class names... ", nl=False)
+    stmt = c.update().where(c.c.id == bindparam('_id')).values(package=bindparam('package'),
+                                                                 simple_name=bindparam('simple_name'))
+    with db.engine.begin() as conn:
+        for batch in chunked(rows, app.config['IMPORT_BATCH_SIZE']):
+            conn.execute(stmt, [dict(zip(('package', 'simple_name'), util.split_class_name(srg)), _id=cid)
+                                for cid, srg in batch])
+    click.echo("Done")
+
+
+def backfill_mcp_names():
+    h = NameHistory.__table__
+    with db.engine.begin() as conn:
+        for table in Fields, Methods, Parameters:
+            t = table.__table__
+            missing = and_(t.c.last_change_id != None, t.c.mcp_name == None)
+            count = conn.execute(select([func.count()]).select_from(t).where(missing)).scalar()
+            if not count:
+                continue
+            click.echo(f"Copying the names of {count} {t.name}... ", nl=False)
+            conn.execute(t.update().where(missing).values(
+                mcp_name=select([h.c.mcp_name]).where(h.c.id == t.c.last_change_id).as_scalar()))
+            click.echo("Done")
+
+
+def backfill_search_index():
+    if SearchNames.query.first() is not None:
+        return
+    for v in Versions.query.all():
+        click.echo(f"Indexing the names of {v.version} for search... ", nl=False)
+        search.index_version(v.version)
+        click.echo("Done")
+    db.session.commit()
+
+
 @app.cli.command()
 @click.argument("username")
 @click.password_option('--password')
@@ -30,6 +110,45 @@ def adduser(username, password):
     click.echo("User created.")
 
 
+@app.cli.command()
+@click.argument("username")
+@click.option("--name", help="What the key is used for.")
+def add_apikey(username, name):
+    """Creates an api key which can be exchanged for a login token"""
+    user = Users.query.filter_by(username=username).one_or_none()
+    if user is None:
+        raise click.ClickException("No such user")
+    key = util.generate_api_key()
+    db.session.add(ApiKeys(name=name, key_hash=util.hash_api_key(key), user=user))
+    db.session.commit()
+    click.echo("Api key created. It won't be shown again.")
+    click.echo(key)
+
+
+@app.cli.command()
+@click.argument("username")
+def remove_apikeys(username):
+    """Deletes every api key of a user"""
+    user = Users.query.filter_by(username=username).one_or_none()
+    if user is None:
+        raise click.ClickException("No such user")
+    count = ApiKeys.query.filter_by(user_id=user.id).delete()
+    db.session.commit()
+    click.echo(f"Deleted {count} api keys.")
+
+
+@app.cli.command()
+@click.argument("username")
+def revoke_tokens(username):
+    """Invalidates every login token of a user"""
+    user = Users.query.filter_by(username=username).one_or_none()
+    if user is None:
+        raise click.ClickException("No such user")
+    user.token_version = Users.token_version + 1
+    db.session.commit()
+    click.echo(f"Tokens revoked. It may take up to {app.config['AUTH_CACHE_TTL']} seconds to take effect.")
+
+
 @app.cli.command()
 @click.argument("version", type=util.get_version)
 def promote(version: Versions):
@@ -39,16 +158,22 @@ def promote(version: Versions):
     """
     if version.latest:
         raise click.ClickException("Version is already promoted")
-    util.get_latest().latest = None
+    latest = util.get_latest()
+    latest.latest = None
     version.latest = Active.true
+    # Both versions are served differently under 'latest' now
+    util.bump_revision(latest.version, version.version)
 
     db.session.commit()
+    _build_snapshots(latest.version, version.version)
 
 
 @app.cli.command()
 @click.argument("version", type=str)
 @click.option("--target", type=util.get_version, default="latest")
-def import_mcp(version: str, target: Versions):
+@click.option("--zip", "zip_path", type=click.Path(exists=True, dir_okay=False),
+              help="Read the mappings from a local zip instead of downloading them.")
+def import_mcp(version: str, target: Versions, zip_path):
     # Import as the first user (admin)
     user: Users = Users.query.first()
     if user is None:
@@ -58,116 +183,363 @@ def import_mcp(version: str, target: Versions):
     if target is None:
         raise click.ClickException("No such version. You may need to import it using 'flask import-tsrg'")
 
-    versions = maven.mcp_stable.load_versions()
-    if version not in versions:
-        raise click.ClickException("mcp_stable version does not exist.")
+    if zip_path:
+        artifact = None
+        name = zip_path
+    else:
+        versions = maven.mcp_stable.load_versions()
+        if version not in versions:
+            raise click.ClickException("mcp_stable version does not exist.")
+        artifact = versions[version]
+        name = artifact.artifact
 
-    artifact = versions[version]
-    click.echo(f"Will import '{artifact.artifact}' into '{target.version}' as user '{user.username}'.")
+    click.echo(f"Will import '{name}' into '{target.version}' as user '{user.username}'.")
     click.confirm("Confirm?")
 
-    click.echo(f"Fetching mcp_stable {artifact.artifact}")
-    mappings = mcp.load_mcp_mappings(artifact)
+    if artifact is None:
+        mappings = mcp.read_mcp_zip(zip_path)
+    else:
+        click.echo(f"Fetching mcp_stable {artifact.artifact}")
+        mappings = mcp.load_mcp_mappings(artifact)
     import_mcp_mappings(user, target.version, mappings)
+    stats.refresh_stats(target.version)
+    util.bump_revision(target.version)
 
     click.echo("Committing... ", nl=False)
     db.session.commit()
     click.echo("Done")
+    _build_snapshots(target.version)
 
 
-def import_mcp_mappings(user: Users, version: str, mappings: mcp.McpExport):
-    def process(m, table: McpNamedTable):
-        name = table.__tablename__
-        entries = {e.srg_name: e for e in table.query.filter_by(version=version)}
-        for i, e in enumerate(m):
-            click.echo(f"\rProcessing {i + 1}/{len(m) + 1} {name}... ", nl=False)
-            if e.searge in entries:
-                info = entries[e.searge]
-                if info.last_change is None:
-                    info.last_change = NameHistory(
-                        member_type=table.member_type,
-                        srg_name=e.searge,
-                        mcp_name=e.name,
-                        changed_by=user
-                    )
-        click.echo("Done")
+# Names of the mcp csv being imported, so they can be joined against the members
+mcp_staging = temporary_table(
+    'mcp_import',
+    Column('srg_name', Text, primary_key=True),
+    Column('mcp_name', Text, nullable=False),
+    # The history row created for the name
+    Column('change_id', Integer)
+)
 
-    fields = mappings.fields, Fields
-    methods = mappings.methods, Methods
-    params = mappings.params, Parameters
 
-    for f, t in fields, methods, params:
-        process(f, t)
+def import_mcp_mappings(user: Users, version: str, mappings: mcp.McpExport):
+    """Names every member which doesn't have a name yet.
+
+    The rows of each csv are loaded into a staging table, then the history
+    rows are created with one statement. Their ids are noted in the staging
+    table, which the members are linked through with one more statement.
+    """
+    conn = db.session.connection()
+    h, s = NameHistory.__table__, mcp_staging
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+    phases = Phases()
+    now = datetime.utcnow()
+
+    s.create(conn)
+    for rows, table in (mappings.fields, Fields), (mappings.methods, Methods), (mappings.params, Parameters):
+        t = table.__table__
+        member_type = literal(table.member_type, h.c.member_type.type)
+
+        with phases.phase(f"{t.name}: staging") as phase:
+            conn.execute(s.delete())
+            # The first row of a name wins
+            names = {}
+            for e in rows:
+                names.setdefault(e.searge, e.name)
+            phase['rows'] = insert_batched(conn, s, ({'srg_name': srg, 'mcp_name': name}
+                                                     for srg, name in names.items()), batch_size)
+
+        unnamed = and_(t.c.version == version, t.c.last_change_id == None)
+
+        with phases.phase(f"{t.name}: history") as phase:
+            query = select([member_type, s.c.srg_name, s.c.mcp_name, literal(user.id),
+                            literal(now, DateTime), literal(now, DateTime)]) \
+                .where(exists(select([t.c.id]).where(unnamed).where(t.c.srg_name == s.c.srg_name)))
+            change_ids = insert_select_returning_ids(
+                conn, h, ['member_type', 'srg_name', 'mcp_name', 'changed_by_id', 'created', 'updated'], query,
+                'srg_name')
+            conn.execute(s.update().where(s.c.srg_name == bindparam('_srg_name'))
+                         .values(change_id=bindparam('_change_id')),
+                         [{'_srg_name': srg, '_change_id': cid} for srg, cid in change_ids.items()])
+            phase['rows'] = len(change_ids)
+
+        with phases.phase(f"{t.name}: link") as phase:
+            named = select([s.c.srg_name]).where(s.c.change_id != None)
+            last_change = select([s.c.change_id]).where(s.c.srg_name == t.c.srg_name).as_scalar()
+            mcp_name = select([s.c.mcp_name]).where(s.c.srg_name == t.c.srg_name).as_scalar()
+            phase['rows'] = conn.execute(t.update()
+                                         .where(unnamed)
+                                         .where(t.c.srg_name.in_(named))
+                                         .values(last_change_id=last_change, mcp_name=mcp_name,
+                                                 updated=now)).rowcount
+
+        click.echo(f"Imported {phase['rows']} {t.name}")
+
+    s.drop(conn)
+    with phases.phase("search index") as phase:
+        phase['rows'] = search.index_names(e.name for rows in (mappings.fields, mappings.methods, mappings.params)
+                                           for e in rows)
+    click.echo(phases.report())
 
 
 @app.cli.command()
 @click.argument("target", type=util.get_version)
 @click.option("--origin", type=util.get_version, default='latest')
-def migrate_mcp(target: Versions, origin: Versions):
-    migrate_mcp_mappings(origin.version, target.version)
-
-
-def migrate_mcp_mappings(mcp_from, mcp_to):
-    def migrate(table):
-        name = table.__tablename__
-        old_entries = {e.srg_name: e for e in table.query.filter_by(version=mcp_from)}
-        new_entries = table.query.filter_by(version=mcp_to).all()
-        for i, entry in enumerate(new_entries):
-            click.echo(f"\rProcessed {i + 1}/{len(new_entries) + 1} {name}... ", nl=False)
-            if entry.srg_name in old_entries and entry.last_change is None:
-                entry.last_change = old_entries[entry.srg_name].last_change
-        click.echo("Done")
-        db.session.commit()
+@click.option("--dry-run", is_flag=True, help="Only count the members which would be named.")
+def migrate_mcp(target: Versions, origin: Versions, dry_run):
+    migrate_mcp_mappings(origin.version, target.version, dry_run)
+    if dry_run:
+        db.session.rollback()
+        return
+    stats.refresh_stats(target.version)
+    util.bump_revision(target.version)
+    db.session.commit()
+    _build_snapshots(target.version)
+
+
+# The newest name of each srg name of the version being migrated from
+migrate_staging = temporary_table(
+    'mcp_migrate',
+    Column('srg_name', Text, primary_key=True),
+    Column('last_change_id', Integer, nullable=False),
+    Column('mcp_name', Text)
+)
+
+
+def migrate_mcp_mappings(mcp_from, mcp_to, dry_run=False):
+    """Copies the names of the members of one version to the unnamed members
+    with the same srg name in another. The caller commits.
 
-    for t in Fields, Methods, Parameters:
-        # noinspection PyTypeChecker
-        migrate(t)
+    Members without an srg id, like ``equals``, share their srg name with
+    thousands of others, so the names are grouped into a staging table
+    first, instead of joining the tables with each other.
+    """
+    conn = db.session.connection()
+    h, s = NameHistory.__table__, migrate_staging
+    phases = Phases()
+    now = datetime.utcnow()
+
+    s.create(conn)
+    for table in Fields, Methods, Parameters:
+        t = table.__table__
+
+        with phases.phase(f"{t.name}: staging") as phase:
+            conn.execute(s.delete())
+            # Members sharing an srg name may have different names, take the newest
+            query = select([t.c.srg_name, func.max(t.c.last_change_id)]) \
+                .where(t.c.version == mcp_from) \
+                .where(t.c.last_change_id != None) \
+                .group_by(t.c.srg_name)
+            phase['rows'] = conn.execute(s.insert().from_select(['srg_name', 'last_change_id'], query)).rowcount
+            # Read each name once here, instead of once for every member named by it
+            conn.execute(s.update().values(
+                mcp_name=select([h.c.mcp_name]).where(h.c.id == s.c.last_change_id).as_scalar()))
+
+        unnamed = and_(t.c.version == mcp_to, t.c.last_change_id == None, t.c.srg_name.in_(select([s.c.srg_name])))
+
+        with phases.phase(f"{t.name}: migrate") as phase:
+            if dry_run:
+                phase['rows'] = conn.execute(select([func.count()]).select_from(t).where(unnamed)).scalar()
+            else:
+                last_change = select([s.c.last_change_id]).where(s.c.srg_name == t.c.srg_name).as_scalar()
+                mcp_name = select([s.c.mcp_name]).where(s.c.srg_name == t.c.srg_name).as_scalar()
+                phase['rows'] = conn.execute(t.update().where(unnamed)
+                                             .values(last_change_id=last_change, mcp_name=mcp_name,
+                                                     updated=now)).rowcount
+
+    s.drop(conn)
+    click.echo(f"{'Would migrate' if dry_run else 'Migrated'} names from {mcp_from} to {mcp_to}:")
+    click.echo(phases.report())
 
 
 @app.cli.command()
 @click.argument("version")
-def import_tsrg(version):
+@click.option("--bulk/--orm", default=True, help="Write rows with batched inserts instead of the ORM.")
+@click.option("--zip", "zip_path", type=click.Path(exists=True, dir_okay=False),
+              help="Read the mappings from a local mcp_config zip instead of downloading them.")
+@click.option("--base",
+              help="Copy the members which didn't change from an imported version, and only insert the rest.")
+def import_tsrg(version, bulk, zip_path, base):
     if util.get_version(version):
         raise click.ClickException("Version is already imported")
+    if base is not None and not bulk:
+        raise click.ClickException("--base can't be used with --orm")
+    if base is not None:
+        base = _get_version(base)
+
+    # Left by a bulk import which was killed before it could remove them
+    deleted = _delete_version_rows(version)
+    if deleted:
+        click.echo(f"Removed {deleted} rows of an interrupted import of {version}")
+
+    if zip_path:
+        click.echo(f"Reading {zip_path}")
+        srg = tsrg.read_tsrg_zip(zip_path)
+    else:
+        versions = maven.mcp_config.load_versions()
+        if version not in versions:
+            raise click.ClickException("No such version")
+
+        artifact = versions[version]
+
+        click.echo(f"Fetching {artifact.artifact}")
+        srg = tsrg.load_tsrg_mappings(artifact)
+
+    try:
+        if base is not None:
+            delta_import_tsrg_mappings(version, srg, base.version)
+        elif bulk:
+            bulk_import_tsrg_mappings(version, srg)
+        else:
+            import_tsrg_mappings(version, srg)
+
+        vers = Versions(version=version)
+
+        click.echo("Checking if it needs to be promoted...")
+        latest = util.get_latest()
+        if latest is None:
+            click.echo(f"Promoting {version} to latest.")
+            vers.latest = Active.true
+        else:
+            click.echo("Nope.")
+
+        db.session.add(vers)
+        stats.refresh_stats(version)
+        click.echo("Indexing names for search... ", nl=False)
+        search.index_version(version)
+        click.echo("Done")
+
+        click.echo("Committing to database...", nl=False)
+        db.session.commit()
+        click.echo(" Done")
+    except BaseException:
+        db.session.rollback()
+        if bulk and base is None:
+            # The bulk writer commits on its own connection
+            click.echo("Removing the imported rows...")
+            _delete_version_rows(version)
+        raise
+
+    _build_snapshots(version)
 
-    versions = maven.mcp_config.load_versions()
-    if version not in versions:
+
+@app.cli.command()
+@click.argument("version", type=util.get_version)
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True),
+              help="Where to write the zip. Defaults to mcp_snapshot-<version>.zip")
+def export_mcp(version: Versions, output):
+    """Exports the mcp names of a version as an mcp_snapshot zip"""
+    if version is None:
         raise click.ClickException("No such version")
+    output = output or f"mcp_snapshot-{version.version}.zip"
+    click.echo(f"Exporting {version.version} to {output}... ", nl=False)
+    start = time.perf_counter()
+    size = 0
+    with open(output, 'wb') as f:
+        for chunk in dump.dump_mcp_zip(version.version):
+            f.write(chunk)
+            size += len(chunk)
+    click.echo(f"Done, {size} bytes in {time.perf_counter() - start:.2f}s")
+
+
+def _delete_version_rows(version: str) -> int:
+    """Deletes the members of a version. Returns the number of deleted rows."""
+    deleted = sum(table.query.filter_by(version=version).delete(synchronize_session=False)
+                  for table in (Parameters, Methods, Fields, Classes))
+    db.session.commit()
+    return deleted
 
-    artifact = versions[version]
 
-    click.echo(f"Fetching {artifact.artifact}")
-    srg = tsrg.load_tsrg_mappings(artifact)
+def _get_version(version: str) -> Versions:
+    found = util.get_version(version)
+    if found is None:
+        raise click.ClickException(f"No such version: {version}")
+    return found
 
-    import_tsrg_mappings(version, srg)
 
-    click.echo("Committing to database...", nl=False)
-    db.session.commit()
-    click.echo(" Done")
-    vers = Versions(version=version)
+def _build_snapshots(*versions: str):
+    if not app.config['SNAPSHOTS']:
+        return
+    for version in versions:
+        click.echo(f"Building dump snapshots of {version}... ", nl=False)
+        snapshots.build_snapshots(version)
+        click.echo("Done")
+
+
+@app.cli.command()
+@click.argument("version", required=False)
+def build_snapshots(version):
+    """Writes the compressed dumps of a version, or of every version"""
+    versions = [_get_version(version)] if version else Versions.query.all()
+    _build_snapshots(*(v.version for v in versions))
 
-    click.echo("Checking if it needs to be promoted...")
-    latest = util.get_latest()
-    if latest is None:
-        click.echo(f"Promoting {version} to latest.")
-        vers.latest = Active.true
-    else:
-        click.echo("Nope.")
 
-    db.session.add(vers)
+@app.cli.command()
+@click.argument("version", required=False)
+def refresh_stats(version):
+    """Recounts the summary statistics of a version, or of every version"""
+    versions = [_get_version(version)] if version else Versions.query.all()
+    for v in versions:
+        click.echo(f"Counting {v.version}... ", nl=False)
+        stats.refresh_stats(v.version)
+        click.echo("Done")
     db.session.commit()
 
 
+@app.cli.command()
+@click.argument("version", required=False)
+@click.option("--zip", "zip_path", type=click.Path(exists=True, dir_okay=False),
+              help="Parse a local mcp_config zip instead of downloading it.")
+def bench_tsrg(version, zip_path):
+    """Measures the time and peak memory of parsing an mcp_config version"""
+    if not zip_path:
+        versions = maven.mcp_config.load_versions()
+        if version not in versions:
+            raise click.ClickException("No such version")
+        zip_path = versions[version].download()
+
+    start = time.perf_counter()
+    ts = tsrg.read_tsrg_zip(zip_path)
+    elapsed = time.perf_counter() - start
+    click.echo(f"Parsed {len(ts.classes)} classes, {ts.field_count} fields "
+               f"and {ts.method_count} methods in {elapsed:.3f}s")
+    del ts
+
+    tracemalloc.start()
+    ts = tsrg.read_tsrg_zip(zip_path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    click.echo(f"Peak memory: {peak / 2 ** 20:.1f} MiB, retained: {current / 2 ** 20:.1f} MiB")
+
+    sigs = [m.sig for m in ts.methods]
+    click.echo(f"{len(sigs)} method descriptors, {len(set(sigs))} distinct")
+
+    def bench(name, fn, items):
+        start = time.perf_counter()
+        for i in items:
+            fn(i)
+        click.echo(f"\t{name}: {time.perf_counter() - start:.3f}s")
+
+    bench("parse, uncached", tsrg.parse_descriptor.__wrapped__, sigs)
+    tsrg.parse_descriptor.cache_clear()
+    bench("parse, cached", tsrg.parse_descriptor, sigs)
+    bench("remap, uncached", ts._remap_descriptor, sigs)
+    ts.descriptor.cache_clear()
+    bench("remap, cached", ts.descriptor, sigs)
+
+
 def import_tsrg_mappings(version, mappings: tsrg.TSrg):
     click.echo(f"Loading {version} mappings with...")
     click.echo(f"\t{len(mappings.classes)} classes")
-    click.echo(f"\t{len(mappings.fields)} fields")
-    click.echo(f"\t{len(mappings.methods)} methods")
-    click.echo(f"\t{sum(len(m.desc[0]) for m in mappings.methods.values())} parameters")
+    click.echo(f"\t{mappings.field_count} fields")
+    click.echo(f"\t{mappings.method_count} methods")
+    click.echo(f"\t{mappings.param_count} parameters")
 
     for n, cl in enumerate(mappings.classes):
         click.echo(f"\rProcessed {n + 1}/{len(mappings.classes)} classes", nl=False)
-        clas = Classes(version=version, obf_name=cl.obf.replace('/', '.'), srg_name=cl.srg.replace('/', '.'))
+        srg_name = cl.srg.replace('/', '.')
+        package, simple_name = util.split_class_name(srg_name)
+        clas = Classes(version=version, obf_name=cl.obf.replace('/', '.'), srg_name=srg_name,
+                       package=package, simple_name=simple_name)
 
         for field in cl.fields.values():
             sid = field.srg_id
@@ -175,7 +547,7 @@ def import_tsrg_mappings(version, mappings: tsrg.TSrg):
                 Fields(version=version, obf_name=field.obf, srg_name=field.srg, srg_id=sid, locked=sid is None))
 
         for method in cl.methods.values():
-            desc = mappings.descriptor(method.desc)
+            desc = mappings.descriptor(method.sig)
             sid = method.srg_id
             mtd = Methods(version=version, obf_name=method.obf, srg_name=method.srg, srg_id=sid,
                           locked=sid is None, descriptor=desc)
@@ -183,9 +555,296 @@ def import_tsrg_mappings(version, mappings: tsrg.TSrg):
 
             for i, (p_type, p_name) in enumerate(zip(method.desc[0], method.params)):
                 param = Parameters(version=version, obf_name='☃', srg_name=p_name, index=i,
-                                   type=mappings.map_type(util.descriptor_to_type(p_type)).replace('/', '.'))
+                                   type=mappings.java_type(p_type))
                 mtd.parameters.append(param)
 
         db.session.add(clas)
 
     click.echo()
+
+
+def bulk_import_tsrg_mappings(version, mappings: tsrg.TSrg):
+    """Imports the mappings using batched executemany inserts.
+
+    Classes are written a batch at a time so their ids, and the ids of their
+    methods, can be resolved with a single query per batch. The rows of the
+    next batches are built while the database writes the current one, on a
+    separate thread with its own connection and transaction.
+    """
+    click.echo(f"Bulk loading {version} mappings with...")
+    click.echo(f"\t{len(mappings.classes)} classes")
+    click.echo(f"\t{mappings.field_count} fields")
+    click.echo(f"\t{mappings.method_count} methods")
+    click.echo(f"\t{mappings.param_count} parameters")
+
+    engine = db.engine
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+    stats = Throughput()
+
+    def build(batches):
+        for batch in batches:
+            yield _build_class_batch(version, mappings, batch)
+
+    def write(batches):
+        n = 0
+        with engine.begin() as conn:
+            for batch in batches:
+                _write_class_batch(conn, version, batch, batch_size, stats)
+                n += len(batch.classes)
+                click.echo(f"\rProcessed {n}/{len(mappings.classes)} classes", nl=False)
+                yield batch
+        click.echo()
+
+    pipeline = Pipeline(app.config['IMPORT_QUEUE_SIZE'])
+    pipeline.stage("build rows", build)
+    pipeline.stage("write", write)
+    pipeline.run("classes", chunked(mappings.classes, app.config['IMPORT_CLASS_BATCH_SIZE']))
+
+    click.echo(stats.report())
+    click.echo(pipeline.report())
+
+
+def _class_row(version, cl: tsrg.TClass):
+    srg_name = cl.srg.replace('/', '.')
+    package, simple_name = util.split_class_name(srg_name)
+    return {
+        'version': version,
+        'obf_name': cl.obf.replace('/', '.'),
+        'srg_name': srg_name,
+        'package': package,
+        'simple_name': simple_name
+    }
+
+
+def _field_row(version, field: tsrg.TField, class_id):
+    sid = field.srg_id
+    return {
+        'version': version,
+        'obf_name': field.obf,
+        'srg_name': field.srg,
+        'srg_id': sid,
+        'locked': sid is None,
+        'class_id': class_id
+    }
+
+
+def _method_row(version, mappings: tsrg.TSrg, method: tsrg.TMethod, class_id):
+    sid = method.srg_id
+    return {
+        'version': version,
+        'obf_name': method.obf,
+        'srg_name': method.srg,
+        'srg_id': sid,
+        'locked': sid is None,
+        'descriptor': mappings.descriptor(method.sig),
+        'class_id': class_id
+    }
+
+
+def _param_rows(version, mappings: tsrg.TSrg, method: tsrg.TMethod, method_id):
+    for i, (p_type, p_name) in enumerate(zip(method.desc[0], method.params)):
+        yield {
+            'version': version,
+            'obf_name': '☃',
+            'srg_name': p_name,
+            'index': i,
+            'type': mappings.java_type(p_type),
+            'method_id': method_id
+        }
+
+
+class _ClassBatch(NamedTuple):
+    """The rows of a batch of classes. Members are paired with the srg names of their owners,
+    which are replaced with ids once the owners are written."""
+    classes: List[dict]
+    fields: List[Tuple[str, dict]]
+    methods: List[Tuple[str, dict]]
+    params: List[Tuple[str, str, dict]]
+
+
+def _build_class_batch(version, mappings: tsrg.TSrg, classes) -> _ClassBatch:
+    batch = _ClassBatch([], [], [], [])
+    for cl in classes:
+        row = _class_row(version, cl)
+        class_name = row['srg_name']
+        batch.classes.append(row)
+        for field in cl.fields.values():
+            batch.fields.append((class_name, _field_row(version, field, None)))
+        for method in cl.methods.values():
+            batch.methods.append((class_name, _method_row(version, mappings, method, None)))
+            for param in _param_rows(version, mappings, method, None):
+                batch.params.append((class_name, method.srg, param))
+    return batch
+
+
+def _write_class_batch(conn, version, batch: _ClassBatch, batch_size, stats: Throughput):
+    c, f, m, p = (t.__table__ for t in (Classes, Fields, Methods, Parameters))
+
+    stats.add(c.name, insert_batched(conn, c, batch.classes, batch_size))
+
+    class_ids = {srg: cid for srg, cid in conn.execute(
+        select([c.c.srg_name, c.c.id]).where(c.c.version == version)
+            .where(c.c.srg_name.in_([row['srg_name'] for row in batch.classes])))}
+
+    for rows, table in (batch.fields, f), (batch.methods, m):
+        for class_name, row in rows:
+            row['class_id'] = class_ids[class_name]
+        stats.add(table.name, insert_batched(conn, table, (row for _, row in rows), batch_size))
+
+    method_ids = {(class_id, srg): mid for mid, class_id, srg in conn.execute(
+        select([m.c.id, m.c.class_id, m.c.srg_name]).where(m.c.class_id.in_(list(class_ids.values()))))}
+
+    for class_name, method_name, row in batch.params:
+        row['method_id'] = method_ids[class_ids[class_name], method_name]
+    stats.add(p.name, insert_batched(conn, p, (row for _, _, row in batch.params), batch_size))
+
+
+# Ids of the base version's rows which are copied as they are, with the id of their new owner
+copy_staging = temporary_table(
+    'tsrg_copy',
+    Column('id', Integer, primary_key=True),
+    Column('owner_id', Integer, nullable=False)
+)
+
+
+def delta_import_tsrg_mappings(version, mappings: tsrg.TSrg, base: str):
+    """Imports the mappings by diffing them against an already imported version.
+
+    Members are matched by the srg name of their class and their own srg name.
+    Unchanged ones, along with their parameters, are copied by the database
+    with INSERT ... SELECT. Only added and changed members are sent from here.
+    Names aren't copied, use migrate-mcp for that.
+    """
+    click.echo(f"Loading {version} mappings on top of {base} with...")
+    click.echo(f"\t{len(mappings.classes)} classes")
+    click.echo(f"\t{mappings.field_count} fields")
+    click.echo(f"\t{mappings.method_count} methods")
+    click.echo(f"\t{mappings.param_count} parameters")
+
+    conn = db.session.connection()
+    c, f, m, p = (t.__table__ for t in (Classes, Fields, Methods, Parameters))
+    s = copy_staging
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+    phases = Phases()
+    now = datetime.utcnow()
+
+    with phases.phase(f"loading {base}") as phase:
+        base_classes = {cid: (srg, obf) for cid, srg, obf in conn.execute(
+            select([c.c.id, c.c.srg_name, c.c.obf_name]).where(c.c.version == base))}
+        base_fields = {(base_classes[cid][0], srg): (fid, obf) for fid, cid, srg, obf in conn.execute(
+            select([f.c.id, f.c.class_id, f.c.srg_name, f.c.obf_name]).where(f.c.version == base))}
+        base_methods = {(base_classes[cid][0], srg): (mid, obf, desc) for mid, cid, srg, obf, desc in conn.execute(
+            select([m.c.id, m.c.class_id, m.c.srg_name, m.c.obf_name, m.c.descriptor]).where(m.c.version == base))}
+        base_params: Dict[int, List[str]] = {}
+        for mid, srg in conn.execute(select([p.c.method_id, p.c.srg_name])
+                                     .where(p.c.version == base).order_by(p.c.method_id, p.c.index)):
+            base_params.setdefault(mid, []).append(srg)
+        phase['rows'] = len(base_classes) + len(base_fields) + len(base_methods) + len(base_params)
+
+    # table name -> [added, changed, removed, copied]
+    changes = {t.name: [0, 0, 0, 0] for t in (c, f, m)}
+
+    with phases.phase("diffing") as phase:
+        class_names = {srg: obf for srg, obf in base_classes.values()}
+        copied_fields, copied_methods = [], []
+        added_fields, added_methods = [], []
+        for cl in mappings.classes:
+            class_name = cl.srg.replace('/', '.')
+            obf = class_names.pop(class_name, None)
+            if obf is None:
+                changes[c.name][0] += 1
+            elif obf != cl.obf.replace('/', '.'):
+                changes[c.name][1] += 1
+            else:
+                changes[c.name][3] += 1
+
+            for field in cl.fields.values():
+                old = base_fields.pop((class_name, field.srg), None)
+                if old is not None and old[1] == field.obf:
+                    copied_fields.append((old[0], class_name))
+                else:
+                    changes[f.name][0 if old is None else 1] += 1
+                    added_fields.append((class_name, field))
+
+            for method in cl.methods.values():
+                old = base_methods.pop((class_name, method.srg), None)
+                if old is not None and old[1] == method.obf and old[2] == mappings.descriptor(method.sig) \
+                        and tuple(base_params.get(old[0], ())) == method.params:
+                    copied_methods.append((old[0], class_name, method.srg))
+                else:
+                    changes[m.name][0 if old is None else 1] += 1
+                    added_methods.append((class_name, method))
+
+        changes[c.name][2] = len(class_names)
+        changes[f.name][2] = len(base_fields)
+        changes[m.name][2] = len(base_methods)
+        changes[f.name][3] = len(copied_fields)
+        changes[m.name][3] = len(copied_methods)
+        phase['rows'] = len(added_fields) + len(added_methods)
+
+    with phases.phase(c.name) as phase:
+        phase['rows'] = insert_batched(conn, c, (_class_row(version, cl) for cl in mappings.classes), batch_size)
+        class_ids = {srg: cid for srg, cid in conn.execute(
+            select([c.c.srg_name, c.c.id]).where(c.c.version == version))}
+
+    stamps = [literal(now, DateTime), literal(now, DateTime)]
+    s.create(conn)
+
+    with phases.phase(f"{f.name}: copy") as phase:
+        insert_batched(conn, s, ({'id': fid, 'owner_id': class_ids[class_name]}
+                                 for fid, class_name in copied_fields), batch_size)
+        query = select([literal(version), f.c.obf_name, f.c.srg_name, f.c.srg_id, f.c.locked, s.c.owner_id,
+                        *stamps]) \
+            .select_from(f.join(s, s.c.id == f.c.id))
+        phase['rows'] = conn.execute(f.insert().from_select(
+            ['version', 'obf_name', 'srg_name', 'srg_id', 'locked', 'class_id', 'created', 'updated'],
+            query)).rowcount
+
+    with phases.phase(f"{m.name}: copy") as phase:
+        conn.execute(s.delete())
+        insert_batched(conn, s, ({'id': mid, 'owner_id': class_ids[class_name]}
+                                 for mid, class_name, _ in copied_methods), batch_size)
+        query = select([literal(version), m.c.obf_name, m.c.srg_name, m.c.srg_id, m.c.locked, m.c.descriptor,
+                        s.c.owner_id, *stamps]) \
+            .select_from(m.join(s, s.c.id == m.c.id))
+        phase['rows'] = conn.execute(m.insert().from_select(
+            ['version', 'obf_name', 'srg_name', 'srg_id', 'locked', 'descriptor', 'class_id', 'created', 'updated'],
+            query)).rowcount
+
+    with phases.phase(f"{p.name}: copy") as phase:
+        method_ids = {(class_id, srg): mid for mid, class_id, srg in conn.execute(
+            select([m.c.id, m.c.class_id, m.c.srg_name]).where(m.c.version == version))}
+        conn.execute(s.delete())
+        insert_batched(conn, s, ({'id': mid, 'owner_id': method_ids[class_ids[class_name], srg]}
+                                 for mid, class_name, srg in copied_methods), batch_size)
+        query = select([literal(version), p.c.obf_name, p.c.srg_name, p.c.index, p.c.type, p.c.locked,
+                        s.c.owner_id, *stamps]) \
+            .select_from(p.join(s, s.c.id == p.c.method_id))
+        phase['rows'] = conn.execute(p.insert().from_select(
+            ['version', 'obf_name', 'srg_name', 'index', 'type', 'locked', 'method_id', 'created', 'updated'],
+            query)).rowcount
+
+    s.drop(conn)
+
+    with phases.phase(f"{f.name}: insert") as phase:
+        phase['rows'] = insert_batched(conn, f, (_field_row(version, field, class_ids[class_name])
+                                                 for class_name, field in added_fields), batch_size)
+
+    with phases.phase(f"{m.name}: insert") as phase:
+        phase['rows'] = insert_batched(conn, m, (_method_row(version, mappings, method, class_ids[class_name])
+                                                 for class_name, method in added_methods), batch_size)
+
+    with phases.phase(f"{p.name}: insert") as phase:
+        method_ids = {(class_id, srg): mid for mid, class_id, srg in conn.execute(
+            select([m.c.id, m.c.class_id, m.c.srg_name]).where(m.c.version == version))}
+
+        def params():
+            for class_name, method in added_methods:
+                yield from _param_rows(version, mappings, method, method_ids[class_ids[class_name], method.srg])
+
+        phase['rows'] = insert_batched(conn, p, params(), batch_size)
+
+    click.echo(f"Changes since {base}:")
+    for name, (added, changed, removed, copied) in changes.items():
+        click.echo(f"\t{name}: {added} added, {changed} changed, {removed} removed, {copied} unchanged")
+    click.echo(phases.report())
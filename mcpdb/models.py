@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import enum
+from datetime import datetime
 from typing import List, Union, Type
 
-from sqlalchemy import Text, ForeignKey, Column, Integer, Boolean, Enum
+from sqlalchemy import Text, ForeignKey, Column, Integer, Boolean, Enum, Index, UniqueConstraint, DateTime
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import relationship
 from sqlalchemy_utils import Timestamp, generic_repr, PasswordType, Password
@@ -16,12 +17,16 @@ __all__ = (
     "SrgNamed",
     "McpNamed",
     "Users",
+    "ApiKeys",
     "Versions",
     "NameHistory",
     "Classes",
     "Fields",
     "Methods",
     "Parameters",
+    "VersionStats",
+    "SearchNames",
+    "SearchTrigrams",
     "SrgNamedTable",
     "McpNamedTable"
 )
@@ -42,15 +47,33 @@ class MemberType(enum.Enum):
 
 
 class SrgNamed:
+    # Columns of the composite indexes used by the lookups
+    __lookup_indexes__ = (
+        ('version', 'srg_name'),
+        ('version', 'obf_name')
+    )
+
     version: str = Column(Text, nullable=False)
     obf_name: str = Column(Text, nullable=False)
     srg_name: str = Column(Text, nullable=False)
 
+    @declared_attr
+    def __table_args__(cls):
+        return tuple(Index(f"ix_{cls.__tablename__}_{'_'.join(cols)}", *cols) for cols in cls.__lookup_indexes__)
+
 
 class McpNamed(SrgNamed, Timestamp):
+    __lookup_indexes__ = SrgNamed.__lookup_indexes__ + (
+        ('last_change_id',),
+        ('version', 'mcp_name')
+    )
+
     member_type: MemberType
 
     locked: bool = Column(Boolean, default=False)
+    # The name set by the last change. Written together with last_change_id,
+    # so reading names doesn't need to join the history.
+    mcp_name: str = Column(Text)
 
     @declared_attr
     def last_change_id(self) -> int:
@@ -66,16 +89,37 @@ class Users(db.Model, Identifiable):
     username: str = Column(Text, nullable=False)
     password: Password = Column(PasswordType(schemes='pbkdf2_sha512'), nullable=False)
     admin: bool = Column(Boolean, default=False)
+    # Increment to revoke every token issued to the user
+    token_version: int = Column(Integer, nullable=False, default=0, server_default='0')
+
+
+@generic_repr
+class ApiKeys(db.Model, Identifiable, Timestamp):
+    """Long lived keys for scripts. Only the sha256 digest of the key is stored."""
+    name: str = Column(Text)
+    key_hash: str = Column(Text, nullable=False, unique=True)
+    user_id: int = Column(Integer, ForeignKey(Users.id), nullable=False)
+    user: Users = relationship(Users)
 
 
 @generic_repr
 class Versions(db.Model, Identifiable):
     version: str = Column(Text, nullable=False, unique=True)
     latest: bool = Column(Enum(Active), unique=True)
+    # Incremented whenever the mappings of the version change. Used for the ETag of responses.
+    revision: int = Column(Integer, nullable=False, default=0, server_default='0')
+    changed: datetime = Column(DateTime, default=datetime.utcnow)
 
 
 @generic_repr
 class NameHistory(db.Model, Identifiable, Timestamp):
+    __table_args__ = (
+        # The history of a member and of a user, in the order it's paged in
+        Index('ix_name_history_member_type_srg_name_created', 'member_type', 'srg_name', 'created', 'id'),
+        Index('ix_name_history_changed_by_id_created', 'changed_by_id', 'created', 'id'),
+        Index('ix_name_history_mcp_name', 'mcp_name')
+    )
+
     member_type: MemberType = Column(Enum(MemberType), nullable=False)
     srg_name: str = Column(Text, nullable=False)
     mcp_name: str = Column(Text, nullable=False)
@@ -85,12 +129,25 @@ class NameHistory(db.Model, Identifiable, Timestamp):
 
 @generic_repr
 class Classes(db.Model, Identifiable, SrgNamed):
+    __lookup_indexes__ = SrgNamed.__lookup_indexes__ + (
+        ('version', 'simple_name'),
+    )
+
+    # The srg name split at the last dot, so classes can be found by their short name
+    package: str = Column(Text)
+    simple_name: str = Column(Text)
+
     fields: List[Fields] = relationship("Fields", back_populates="owner")
     methods: List[Methods] = relationship("Methods", back_populates="owner")
 
 
 @generic_repr
 class Methods(db.Model, Identifiable, McpNamed):
+    __lookup_indexes__ = McpNamed.__lookup_indexes__ + (
+        ('version', 'srg_id'),
+        ('class_id', 'srg_name')
+    )
+
     member_type = MemberType.method
 
     srg_id: str = Column(Integer)
@@ -103,6 +160,11 @@ class Methods(db.Model, Identifiable, McpNamed):
 
 @generic_repr
 class Fields(db.Model, Identifiable, McpNamed):
+    __lookup_indexes__ = McpNamed.__lookup_indexes__ + (
+        ('version', 'srg_id'),
+        ('class_id', 'srg_name')
+    )
+
     member_type = MemberType.field
 
     srg_id: str = Column(Integer)
@@ -112,6 +174,10 @@ class Fields(db.Model, Identifiable, McpNamed):
 
 @generic_repr
 class Parameters(db.Model, Identifiable, McpNamed):
+    __lookup_indexes__ = McpNamed.__lookup_indexes__ + (
+        ('method_id',),
+    )
+
     member_type = MemberType.parameter
 
     index = Column(Integer, nullable=False)
@@ -120,6 +186,35 @@ class Parameters(db.Model, Identifiable, McpNamed):
     owner: Methods = relationship("Methods", back_populates='parameters')
 
 
+@generic_repr
+class VersionStats(db.Model, Identifiable):
+    """Member counts of a version, kept up to date so the summary doesn't need to count them."""
+    __table_args__ = (
+        UniqueConstraint('version', 'member_type'),
+    )
+
+    version: str = Column(Text, nullable=False)
+    member_type: MemberType = Column(Enum(MemberType), nullable=False)
+    total: int = Column(Integer, nullable=False)
+    mapped: int = Column(Integer, nullable=False)
+
+
+@generic_repr
+class SearchNames(db.Model, Identifiable):
+    """Every distinct srg, obf and mcp name of any version, so they can be searched
+    by prefix and by similarity. Names are added by imports and renames."""
+    name: str = Column(Text, nullable=False, unique=True)
+    # The lowercase name, searched by prefix
+    key: str = Column(Text, nullable=False, index=True)
+    trigram_count: int = Column(Integer, nullable=False)
+
+
+class SearchTrigrams(db.Model):
+    """The trigrams of the lowercase search names, used for fuzzy searches."""
+    trigram: str = Column(Text, primary_key=True)
+    name_id: int = Column(Integer, ForeignKey(SearchNames.id), primary_key=True)
+
+
 db.Model.metadata.create_all(db.engine)
 
 McpNamedTable = Type[Union[Methods, Fields, Parameters]]
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import hashlib
+import secrets
+from datetime import datetime
+from typing import Tuple
+
+from .descriptor import descriptor_to_type
 from ..models import Versions, Active
 
 __all__ = (
     "get_latest",
     "get_version",
+    "bump_revision",
+    "split_class_name",
+    "generate_api_key",
+    "hash_api_key",
     "descriptor_to_type"
 )
 
@@ -19,24 +29,28 @@ def get_version(version) -> Versions:
     return Versions.query.filter_by(version=version).one_or_none()
 
 
-SIMPLE_DESC = {
-    'Z': 'boolean',
-    'B': 'byte',
-    'C': 'char',
-    'S': 'short',
-    'I': 'int',
-    'J': 'long',
-    'F': 'float',
-    'D': 'double'
-}
-
-
-def descriptor_to_type(desc):
-    c = desc[0]
-    if c == 'L':
-        return desc[1:-1]
-    if c == '[':
-        return descriptor_to_type(desc[1:]) + '[]'
-    if c in SIMPLE_DESC:
-        return SIMPLE_DESC[c]
-    raise ValueError("Unexpected descriptor format: " + desc)
+def bump_revision(*versions: str):
+    """Marks the mappings of versions as changed, so cached responses are revalidated.
+    The caller commits the session."""
+    Versions.query.filter(Versions.version.in_(versions)) \
+        .update({Versions.revision: Versions.revision + 1, Versions.changed: datetime.utcnow()},
+                synchronize_session=False)
+
+
+def split_class_name(name: str) -> Tuple[str, str]:
+    """Splits a dotted class name into its package and simple name."""
+    i = name.rfind('.')
+    return name[:max(i, 0)], name[i + 1:]
+
+
+API_KEY_PREFIX = 'mcpdb_'
+
+
+def generate_api_key() -> str:
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+def hash_api_key(key: str) -> str:
+    """Api keys are random, so a plain digest is enough to store them.
+    Looking them up by digest also avoids timing differences on the key itself."""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Any, Sequence, Tuple
+
+from sqlalchemy import Table, MetaData, Column, select, func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select, Insert
+
+__all__ = (
+    "chunked",
+    "insert_batched",
+    "insert_returning_ids",
+    "insert_select_returning_ids",
+    "temporary_table",
+    "Throughput",
+    "Phases"
+)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert_ignoring_conflicts(conn: Connection, table: Table) -> Insert:
+    """An insert which skips rows that would break a unique constraint."""
+    if conn.dialect.name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if conn.dialect.name == 'mysql':
+        return table.insert().prefix_with('IGNORE')
+    return table.insert().prefix_with('OR IGNORE')
+
+
+def insert_batched(conn: Connection, table: Table, rows: Iterable[Dict[str, Any]], batch_size: int,
+                   ignore_conflicts=False) -> int:
+    """Inserts rows using executemany in batches of ``batch_size``.
+
+    :param ignore_conflicts: Skip rows which are already in the table, such as
+        ones added concurrently by another process, instead of failing
+    :return: The number of rows given
+    """
+    insert = _insert_ignoring_conflicts(conn, table) if ignore_conflicts else table.insert()
+    total = 0
+    for batch in chunked(rows, batch_size):
+        conn.execute(insert, batch)
+        total += len(batch)
+    return total
+
+
+def insert_returning_ids(conn: Connection, table: Table, rows: Iterable[Dict[str, Any]], key: Sequence[str],
+                         batch_size: int) -> List[int]:
+    """Inserts rows and gets their primary keys.
+
+    Where the database supports RETURNING, each batch is a single multi-row
+    INSERT. Databases don't promise to return its rows in order, so they are
+    matched to the inserted rows by the ``key`` columns. Otherwise, as on
+    SQLite, rows are inserted one at a time and the last row id is read.
+
+    :return: The primary key of each row, in order
+    """
+    if not conn.dialect.implicit_returning:
+        insert = table.insert()
+        return [conn.execute(insert, row).inserted_primary_key[0] for row in rows]
+
+    pk, = table.primary_key.columns
+    ids = []
+    for batch in chunked(rows, batch_size):
+        returned: Dict[tuple, List[int]] = {}
+        for row in conn.execute(table.insert().values(batch).returning(pk, *(table.c[k] for k in key))):
+            returned.setdefault(tuple(row[1:]), []).append(row[0])
+        # Rows with the same key are interchangeable
+        ids.extend(returned[tuple(row[k] for k in key)].pop() for row in batch)
+    return ids
+
+
+def insert_select_returning_ids(conn: Connection, table: Table, columns: List[str], query: Select,
+                                key: str) -> Dict[Any, int]:
+    """Runs an INSERT ... SELECT and gets the primary key of each new row by its
+    ``key`` column, which has to be unique among the selected rows.
+
+    The keys come from RETURNING where the database supports it. SQLite has
+    none in SQLAlchemy 1.3, but it allows a single writer, which keeps its
+    lock until the transaction ends. So the new rows have the highest ids
+    afterwards.
+    """
+    pk, = table.primary_key.columns
+    insert = table.insert().from_select(columns, query)
+    if conn.dialect.implicit_returning:
+        return {k: i for i, k in conn.execute(insert.returning(pk, table.c[key]))}
+
+    count = conn.execute(insert).rowcount
+    if not count:
+        return {}
+    last = conn.execute(select([func.max(pk)])).scalar()
+    return {k: i for i, k in conn.execute(select([pk, table.c[key]]).where(pk > last - count))}
+
+
+def temporary_table(name: str, *columns: Column) -> Table:
+    """Defines a table which only exists for the connection that creates it.
+    It has its own metadata, so ``create_all`` never creates it.
+    """
+    return Table(name, MetaData(), *columns, prefixes=['TEMPORARY'])
+
+
+class Throughput:
+    """Keeps track of how many rows were written to each table."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.rows: Dict[str, int] = {}
+
+    def add(self, name: str, count: int):
+        self.rows[name] = self.rows.get(name, 0) + count
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def total(self) -> int:
+        return sum(self.rows.values())
+
+    def report(self) -> str:
+        elapsed = self.elapsed
+        lines = [f"\t{name}: {count} rows" for name, count in self.rows.items()]
+        lines.append(f"\t{self.total} rows in {elapsed:.2f}s ({self.total / max(elapsed, 1e-9):.0f} rows/sec)")
+        return '\n'.join(lines)
+
+
+class Phases:
+    """Times the steps of a command and how many rows each of them touched."""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float, int]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the block. It can set ``rows`` on the yielded dict."""
+        info = {'rows': 0}
+        start = time.perf_counter()
+        yield info
+        self.phases.append((name, time.perf_counter() - start, info['rows']))
+
+    def report(self) -> str:
+        lines = [f"\t{name}: {rows} rows in {elapsed:.2f}s" for name, elapsed, rows in self.phases]
+        lines.append(f"\ttotal: {sum(p[1] for p in self.phases):.2f}s")
+        return '\n'.join(lines)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from flask import g
+from sqlalchemy import select
+
+from . import split_class_name
+from .. import app, db
+from ..models import *
+
+__all__ = (
+    "TableIndex",
+    "VersionIndex",
+    "LookupCache",
+    "lookup_cache"
+)
+
+# (member id, owning class id)
+Entry = Tuple[int, Optional[int]]
+
+
+class TableIndex:
+    """Maps the names of one table's members to their ids."""
+
+    __slots__ = ('by_srg_id', 'by_srg', 'by_obf', 'by_mcp', 'mcp_names')
+
+    def __init__(self):
+        self.by_srg_id: Dict[int, List[Entry]] = {}
+        self.by_srg: Dict[str, List[Entry]] = {}
+        self.by_obf: Dict[str, List[Entry]] = {}
+        self.by_mcp: Dict[str, List[Entry]] = {}
+        # current mcp name of each member id, needed to move it on rename
+        self.mcp_names: Dict[int, Tuple[str, Entry]] = {}
+
+    def add(self, entry: Entry, srg_id, srg_name, obf_name, mcp_name):
+        if srg_id is not None:
+            self.by_srg_id.setdefault(srg_id, []).append(entry)
+        self.by_srg.setdefault(srg_name, []).append(entry)
+        self.by_obf.setdefault(obf_name, []).append(entry)
+        if mcp_name is not None:
+            self.set_mcp_name(entry, mcp_name)
+
+    def set_mcp_name(self, entry: Entry, mcp_name: str):
+        old = self.mcp_names.get(entry[0])
+        if old is not None:
+            entries = self.by_mcp[old[0]]
+            entries.remove(old[1])
+            if not entries:
+                del self.by_mcp[old[0]]
+        self.by_mcp.setdefault(mcp_name, []).append(entry)
+        self.mcp_names[entry[0]] = mcp_name, entry
+
+    def find(self, name: str, owner: int = None) -> List[int]:
+        """Looks up the ids of a name using the same fallbacks as the database
+        lookup: srg id, then srg name, obf name and mcp name.
+
+        :param owner: Only include members of this class
+        """
+
+        def matching(entries):
+            return [mid for mid, oid in entries if owner is None or oid == owner]
+
+        try:
+            return matching(self.by_srg_id.get(int(name), ()))
+        except ValueError:
+            for names in self.by_srg, self.by_obf, self.by_mcp:
+                found = matching(names.get(name, ()))
+                if found:
+                    return found
+            return []
+
+
+class VersionIndex:
+    """Maps the names of every class and member of one version to their ids."""
+
+    def __init__(self, version: str, revision: int):
+        self.version = version
+        self.revision = revision
+        self.loaded = time.monotonic()
+        self.classes_by_obf: Dict[str, List[int]] = {}
+        # simple class name -> (id, full srg name)
+        self.classes_by_name: Dict[str, List[Tuple[int, str]]] = {}
+        self.tables: Dict[McpNamedTable, TableIndex] = {}
+
+    @classmethod
+    def load(cls, version: str) -> VersionIndex:
+        with db.engine.connect() as conn:
+            # Read first, so changes made while loading cause another reload rather than being missed
+            v = Versions.__table__
+            index = cls(version, conn.execute(select([v.c.revision]).where(v.c.version == version)).scalar())
+            c = Classes.__table__
+            query = select([c.c.id, c.c.obf_name, c.c.srg_name, c.c.simple_name]).where(c.c.version == version)
+            for cid, obf, srg, simple_name in conn.execute(query):
+                index.classes_by_obf.setdefault(obf, []).append(cid)
+                index.classes_by_name.setdefault(simple_name, []).append((cid, srg))
+
+            for table in Fields, Methods, Parameters:
+                t = table.__table__
+                owner = t.c.method_id if table is Parameters else t.c.class_id
+                srg_id = None if table is Parameters else t.c.srg_id
+                query = select([t.c.id, owner, srg_id, t.c.srg_name, t.c.obf_name, t.c.mcp_name]) \
+                    .where(t.c.version == version)
+                tindex = index.tables[table] = TableIndex()
+                for mid, owner_id, sid, srg, obf, mcp in conn.execute(query):
+                    tindex.add((mid, owner_id), sid, srg, obf, mcp)
+        return index
+
+    def find_classes(self, class_name: str) -> List[int]:
+        found = self.classes_by_obf.get(class_name)
+        if found:
+            return found
+        _, simple_name = split_class_name(class_name)
+        return [cid for cid, srg in self.classes_by_name.get(simple_name, ())
+                if srg == class_name or srg.endswith('.' + class_name)]
+
+
+class LookupCache:
+    """An LRU of version indexes, so most lookups are resolved without
+    querying the database.
+
+    Renames made by this process update the cached indexes directly. Changes
+    made by other processes, such as the flask commands or other workers,
+    bump the revision of the version. The revisions are read once per request
+    and an index is reloaded when its version has a newer one. Indexes older
+    than ``ttl`` seconds are reloaded regardless.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._indexes: OrderedDict[str, VersionIndex] = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _expired(self, loaded: float):
+        return time.monotonic() - loaded > self.ttl
+
+    @staticmethod
+    def _versions() -> Dict[str, Tuple[bool, int]]:
+        """Whether each version is the latest and its revision, read with one query per request."""
+        versions = g.get('lookup_versions')
+        if versions is None:
+            versions = g.lookup_versions = {
+                v: (latest is not None, revision)
+                for v, latest, revision in db.session.query(Versions.version, Versions.latest, Versions.revision)}
+        return versions
+
+    def resolve_version(self, version: str) -> Optional[str]:
+        """Resolves a version name, or 'latest', to a loaded version name."""
+        versions = self._versions()
+        if version == 'latest':
+            return next((v for v, (latest, _) in versions.items() if latest), None)
+        return version if version in versions else None
+
+    def get(self, version: str) -> VersionIndex:
+        """Gets the index of a resolved version, loading it if it's missing or outdated."""
+        revision = self._versions().get(version, (False, None))[1]
+        with self._lock:
+            index = self._indexes.get(version)
+            if index is not None and index.revision == revision and not self._expired(index.loaded):
+                self._indexes.move_to_end(version)
+                return index
+
+        index = VersionIndex.load(version)
+
+        with self._lock:
+            self._indexes[version] = index
+            self._indexes.move_to_end(version)
+            while len(self._indexes) > self.size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def renamed(self, member: McpNamed, mcp_name: str):
+        """Updates the cached mcp name of a member after it was renamed."""
+        owner = member.method_id if isinstance(member, Parameters) else member.class_id
+        self.renamed_entry(type(member), member.version, (member.id, owner), mcp_name)
+
+    def renamed_entry(self, table: McpNamedTable, version: str, entry: Entry, mcp_name: str):
+        with self._lock:
+            index = self._indexes.get(version)
+            if index is not None:
+                index.tables[table].set_mcp_name(entry, mcp_name)
+
+    def revised(self, version: str):
+        """Notes that this process bumped the revision of a version once, after
+        updating its cached index, so the index isn't reloaded. If another
+        process bumped it too, the revisions still differ."""
+        with self._lock:
+            index = self._indexes.get(version)
+            if index is not None:
+                index.revision += 1
+
+    def invalidate(self, version: str = None):
+        """Drops the cached index of a version, or everything when no version is given."""
+        with self._lock:
+            if version is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(version, None)
+
+
+lookup_cache = LookupCache(app.config['LOOKUP_CACHE_SIZE'], app.config['LOOKUP_CACHE_TTL'])
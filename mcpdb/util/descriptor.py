@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import re
+import sys
+from functools import lru_cache
+from typing import Tuple, Callable
+
+__all__ = (
+    "Descriptor",
+    "SIMPLE_DESC",
+    "parse_descriptor",
+    "descriptor_to_type",
+    "remap_descriptor",
+    "remap_type"
+)
+
+# Real configs only contain a few thousand distinct descriptors
+CACHE_SIZE = 1 << 16
+
+# (argument types, return type)
+Descriptor = Tuple[Tuple[str, ...], str]
+
+SIMPLE_DESC = {
+    'Z': 'boolean',
+    'B': 'byte',
+    'C': 'char',
+    'S': 'short',
+    'I': 'int',
+    'J': 'long',
+    'F': 'float',
+    'D': 'double'
+}
+
+_signature = re.compile(r'\((.*)\)(.*)')
+_token = re.compile(r'\[*(?:[ZBCSIJFDV]|L[^;]+;)')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_descriptor(signature: str) -> Descriptor:
+    """Splits a method signature into its argument and return types.
+
+    Results are cached, so every method with the same signature shares the same tuple.
+    """
+    m = _signature.fullmatch(signature)
+    if m is None:
+        raise ValueError("Unexpected descriptor format: " + signature)
+    args, ret = m.groups()
+    types = _token.findall(args)
+    if sum(map(len, types)) != len(args):
+        raise ValueError("Unexpected descriptor format: " + signature)
+    return tuple(sys.intern(t) for t in types), sys.intern(ret)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def descriptor_to_type(desc: str) -> str:
+    c = desc[0]
+    if c == 'L':
+        return desc[1:-1]
+    if c == '[':
+        return descriptor_to_type(desc[1:]) + '[]'
+    if c in SIMPLE_DESC:
+        return SIMPLE_DESC[c]
+    raise ValueError("Unexpected descriptor format: " + desc)
+
+
+def remap_type(desc: str, map_class: Callable[[str], str]) -> str:
+    """Maps the class in a field type descriptor, keeping any array dimensions."""
+    dims = len(desc) - len(desc.lstrip('['))
+    if desc[dims] == 'L':
+        return f"{desc[:dims]}L{map_class(desc[dims + 1:-1])};"
+    return desc
+
+
+def remap_descriptor(desc: Descriptor, map_class: Callable[[str], str]) -> str:
+    """Maps the classes in a descriptor and joins it back into a signature."""
+    args, ret = desc
+    return f"({''.join(remap_type(a, map_class) for a in args)}){remap_type(ret, map_class)}"
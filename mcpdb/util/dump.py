@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zipfile
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import select
+
+from .. import db
+from ..models import *
+
+__all__ = (
+    "DUMP_TABLES",
+    "DUMP_FORMATS",
+    "iter_names",
+    "dump_json",
+    "dump_ndjson",
+    "dump_csv",
+    "dump_mcp_zip"
+)
+
+DUMP_TABLES = {
+    'fields': Fields,
+    'methods': Methods,
+    'params': Parameters
+}
+
+DUMP_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+# The header of each csv file in an mcp export
+CSV_HEADERS = {
+    'fields': ('searge', 'name', 'side', 'desc'),
+    'methods': ('searge', 'name', 'side', 'desc'),
+    'params': ('param', 'name', 'side')
+}
+
+# Sides aren't tracked, so everything is exported as both (2)
+SIDE_BOTH = '2'
+
+FETCH_SIZE = 1000
+
+# The files of a zip are dated this, so exports of the same revision are identical
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def iter_names(version: str, table: McpNamedTable) -> Iterator[Tuple[str, str]]:
+    """Yields the srg and current mcp name of every named member in a version.
+
+    The names are read by a single query on a server-side cursor, so
+    memory use doesn't depend on the size of the version.
+    """
+    query = select([table.srg_name, table.mcp_name]) \
+        .where(table.version == version) \
+        .where(table.mcp_name != None) \
+        .order_by(table.srg_name)
+
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(query)
+        while True:
+            rows = result.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+
+def _batched(lines: Iterator[str]) -> Iterator[str]:
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= FETCH_SIZE:
+            yield ''.join(buf)
+            buf.clear()
+    if buf:
+        yield ''.join(buf)
+
+
+def dump_json(version: str, doc=True) -> Iterator[str]:
+    """Writes the dump in the same layout as the marshalled json response."""
+
+    def lines():
+        yield '{'
+        for n, (key, table) in enumerate(DUMP_TABLES.items()):
+            yield f'{"," if n else ""}"{key}":['
+            for i, (srg, mcp) in enumerate(iter_names(version, table)):
+                entry = {'srg_name': srg, 'mcp_name': mcp}
+                if doc:
+                    entry['comment'] = None
+                yield (',' if i else '') + json.dumps(entry)
+            yield ']'
+        yield '}\n'
+
+    return _batched(lines())
+
+
+def dump_ndjson(version: str) -> Iterator[str]:
+    """Writes one json object per line for every named member."""
+
+    def lines():
+        for key, table in DUMP_TABLES.items():
+            member_type = table.member_type.value
+            for srg, mcp in iter_names(version, table):
+                yield json.dumps({'type': member_type, 'srg_name': srg, 'mcp_name': mcp}) + '\n'
+
+    return _batched(lines())
+
+
+def dump_csv(version: str, name: str) -> Iterator[str]:
+    """Writes the named members of one table as an mcp export csv file.
+
+    :param name: One of the keys of ``DUMP_TABLES``
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    header = CSV_HEADERS[name]
+    writer.writerow(header)
+    for srg, mcp in iter_names(version, DUMP_TABLES[name]):
+        writer.writerow((srg, mcp, SIDE_BOTH, '')[:len(header)])
+        if buf.tell() >= io.DEFAULT_BUFFER_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+class _ZipStream(io.RawIOBase):
+    """A write-only stream holding what a zip writer wrote until it's taken.
+    It can't seek, so the sizes of each file are written after its data."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def dump_mcp_zip(version: str) -> Iterator[bytes]:
+    """Writes a zip with the same csv files as an mcp_stable or mcp_snapshot export.
+
+    Each file is compressed while its rows are read, so only the rows of
+    the current batch are held in memory.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name in DUMP_TABLES:
+            info = zipfile.ZipInfo(f'{name}.csv', date_time=ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with z.open(info, 'w') as f:
+                for chunk in dump_csv(version, name):
+                    f.write(chunk.encode('utf-8'))
+                    data = stream.take()
+                    if data:
+                        yield data
+    yield stream.take()
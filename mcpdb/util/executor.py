@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Any
+
+__all__ = (
+    "ExecutorBusy",
+    "BoundedExecutor"
+)
+
+
+class ExecutorBusy(Exception):
+    """Raised when a task is submitted while the queue is full."""
+
+
+class BoundedExecutor:
+    """A thread pool with a limited number of queued tasks, which keeps
+    track of how long tasks waited and ran.
+
+    :param workers: The number of tasks run at once
+    :param queue_size: The number of tasks allowed to wait for a worker
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_time = 0.0
+        self._run_time = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorBusy(f"{self.name} queue is full")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def run():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_time += started - submitted
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._run_time += time.perf_counter() - started
+                self._slots.release()
+
+        return self._pool.submit(run)
+
+    def run(self, fn: Callable, *args, timeout: float = None, **kwargs):
+        """Runs a task on the pool and waits for its result."""
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = max(self._completed, 1)
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queued': self._queued,
+                'running': self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_wait_ms': self._wait_time / completed * 1000,
+                'avg_run_ms': self._run_time / completed * 1000
+            }
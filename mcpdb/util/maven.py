@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import tempfile
+import threading
 from collections import Mapping
 from dataclasses import dataclass
+from typing import Optional, Dict
 from xml.etree import ElementTree
 
 import requests
 
 __all__ = (
+    "ChecksumError",
+    "ArtifactCache",
     "MavenArtifact",
     "MavenProject",
     "mcp_config",
@@ -16,6 +24,129 @@ __all__ = (
 forge_maven = 'https://files.minecraftforge.net/maven'
 
 
+class ChecksumError(Exception):
+    pass
+
+
+class ArtifactCache:
+    """A content addressed cache of downloaded files.
+
+    Files are stored by their sha1 in ``objects/``, and ``index.json`` maps
+    each url to its sha1 and the validators needed to revalidate it. When the
+    server can't be reached, the cached file is used as is.
+    """
+
+    chunk_size = 1 << 16
+    timeout = 30
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, dict]] = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def object_path(self, sha1: str):
+        return os.path.join(self.directory, 'objects', sha1[:2], sha1)
+
+    def _load_index(self) -> Dict[str, dict]:
+        if self._index is None:
+            try:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def cached(self, url: str) -> Optional[str]:
+        """Gets the path of a cached url without revalidating it."""
+        with self._lock:
+            entry = self._load_index().get(url)
+        if entry is not None and os.path.exists(self.object_path(entry['sha1'])):
+            return self.object_path(entry['sha1'])
+        return None
+
+    def fetch(self, url: str, verify=True) -> str:
+        """Downloads a url into the cache, unless the cached copy is still current.
+
+        :param verify: Check the download against the ``.sha1`` file next to it, if there is one
+        :return: The path of the cached file
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            entry = self._load_index().get(url)
+        path = self.cached(url)
+
+        headers = {}
+        if path is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            resp = requests.get(url, headers=headers, stream=True, timeout=self.timeout)
+        except requests.RequestException:
+            if path is None:
+                raise
+            # Offline, use what we have
+            return path
+
+        with resp:
+            if resp.status_code == 304 and path is not None:
+                return path
+            resp.raise_for_status()
+
+            sha1 = hashlib.sha1()
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in resp.iter_content(self.chunk_size):
+                        sha1.update(chunk)
+                        f.write(chunk)
+
+                digest = sha1.hexdigest()
+                if verify:
+                    expected = self._expected_sha1(url)
+                    if expected is not None and expected != digest:
+                        raise ChecksumError(f"{url} has sha1 {digest}, expected {expected}")
+
+                path = self.object_path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+            with self._lock:
+                self._load_index()[url] = {
+                    'sha1': digest,
+                    'etag': resp.headers.get('ETag'),
+                    'last_modified': resp.headers.get('Last-Modified')
+                }
+                self._save_index()
+            return path
+
+    def _expected_sha1(self, url: str) -> Optional[str]:
+        with requests.get(url + '.sha1', timeout=self.timeout) as resp:
+            if resp.status_code == 404:
+                return None
+            resp.raise_for_status()
+            return resp.text.split()[0].strip().lower()
+
+
+# Replaced using the MAVEN_CACHE_DIR config
+cache = ArtifactCache(os.path.join(tempfile.gettempdir(), 'mcpdb-maven'))
+
+
 @dataclass
 class MavenArtifact:
     project: MavenProject
@@ -31,6 +162,10 @@ class MavenArtifact:
     def path(self):
         return '/'.join([self.project.path, self.version, self.artifact])
 
+    def download(self) -> str:
+        """Downloads the artifact into the cache and returns its local path"""
+        return cache.fetch(self.path)
+
 
 @dataclass
 class MavenProject:
@@ -47,10 +182,9 @@ class MavenProject:
         return '/'.join([self.path, 'maven-metadata.xml'])
 
     def load_versions(self) -> Mapping[str, MavenArtifact]:
-        with requests.get(self.maven_metadata) as resp:
-            root = ElementTree.fromstring(resp.content)
-            versions = root.findall(".//version")
-            return {v.text: MavenArtifact(self, v.text) for v in versions}
+        root = ElementTree.parse(cache.fetch(self.maven_metadata)).getroot()
+        versions = root.findall(".//version")
+        return {v.text: MavenArtifact(self, v.text) for v in versions}
 
 
 mcp_config = MavenProject(forge_maven, 'de.oceanlabs.mcp', 'mcp_config')
@@ -1,18 +1,17 @@
-import io
 import zipfile
 from csv import DictReader
 from dataclasses import dataclass
 from typing import List
 from zipfile import ZipFile
 
-import requests
-
 from .maven import *
 
 __all__ = (
     "McpMapping",
     "McpExport",
-    "read_mcp_export"
+    "read_mcp_export",
+    "load_mcp_mappings",
+    "read_mcp_zip"
 )
 
 
@@ -50,6 +49,13 @@ def _read_mappings(reader: DictReader):
 
 
 def load_mcp_mappings(artifact: MavenArtifact):
-    with requests.get(artifact.path) as resp:
-        zipbytes = io.BytesIO(resp.content)
-        return read_mcp_export(zipfile.ZipFile(zipbytes, 'r'))
+    return read_mcp_zip(artifact.download())
+
+
+def read_mcp_zip(file) -> McpExport:
+    """Reads the mappings of an mcp_stable or mcp_snapshot zip.
+
+    :param file: A path or file object
+    """
+    with zipfile.ZipFile(file, 'r') as z:
+        return read_mcp_export(z)
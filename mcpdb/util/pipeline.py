@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import threading
+import time
+from queue import Queue, Empty, Full
+from typing import Callable, Iterable, Iterator, List, Optional
+
+__all__ = (
+    "Stage",
+    "Pipeline"
+)
+
+# Put on a queue after the last item of a stage
+_DONE = object()
+# How often blocked stages check whether another stage failed
+_POLL_INTERVAL = 0.1
+
+
+class _Stopped(Exception):
+    """Unwinds a stage after another stage failed."""
+
+
+class Stage:
+    """A step of a pipeline, and how it spent its time."""
+
+    __slots__ = ('name', 'fn', 'received', 'sent', 'elapsed', 'waiting', 'blocked')
+
+    def __init__(self, name: str, fn: Callable[[Iterator], Optional[Iterable]]):
+        self.name = name
+        self.fn = fn
+        self.received = 0
+        self.sent = 0
+        self.elapsed = 0.0
+        # Time spent waiting for the previous stage, and for the next one to catch up
+        self.waiting = 0.0
+        self.blocked = 0.0
+
+    @property
+    def busy(self) -> float:
+        return self.elapsed - self.waiting - self.blocked
+
+    def report(self) -> str:
+        items = self.sent or self.received
+        return (f"\t{self.name}: {items} items in {self.busy:.2f}s busy ({items / max(self.busy, 1e-9):.0f}/sec), "
+                f"{self.waiting:.2f}s waiting, {self.blocked:.2f}s blocked")
+
+
+class Pipeline:
+    """Runs each stage on its own thread, connected by bounded queues.
+
+    A stage is a function which takes an iterator of the items of the
+    previous stage, and returns the items for the next one. It has to
+    consume every item it's given. The last stage may return None.
+
+    Once a queue is full, the stage feeding it blocks until the next one
+    catches up, so at most ``queue_size`` items are buffered between two stages.
+
+    Stages run without an app context. Pass them anything they need from it.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.stages: List[Stage] = []
+        self._ran: List[Stage] = []
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def stage(self, name: str, fn: Callable[[Iterator], Optional[Iterable]]) -> Pipeline:
+        self.stages.append(Stage(name, fn))
+        return self
+
+    def run(self, name: str, source: Iterable):
+        """Feeds the items of ``source`` to the stages and waits for all of them to finish.
+        The first error raised by a stage is raised again here.
+        """
+        stages = self._ran = [Stage(name, lambda _: source)] + self.stages
+        queues = [Queue(self.queue_size) for _ in stages[1:]]
+        threads = [threading.Thread(target=self._run_stage, name=f"pipeline-{s.name}", daemon=True,
+                                    args=(s, queues[i - 1] if i else None, queues[i] if i < len(queues) else None))
+                   for i, s in enumerate(stages)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
+
+    def report(self) -> str:
+        return '\n'.join(s.report() for s in self._ran)
+
+    def _run_stage(self, stage: Stage, inbox: Optional[Queue], outbox: Optional[Queue]):
+        start = time.perf_counter()
+        try:
+            items = stage.fn(self._receive(stage, inbox) if inbox is not None else iter(()))
+            for item in items or ():
+                if outbox is not None:
+                    self._send(stage, outbox, item)
+                stage.sent += 1
+            if outbox is not None:
+                self._send(stage, outbox, _DONE)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+        finally:
+            stage.elapsed = time.perf_counter() - start
+
+    def _receive(self, stage: Stage, inbox: Queue) -> Iterator:
+        while True:
+            start = time.perf_counter()
+            while True:
+                try:
+                    item = inbox.get(timeout=_POLL_INTERVAL)
+                    break
+                except Empty:
+                    if self._stop.is_set():
+                        raise _Stopped
+            stage.waiting += time.perf_counter() - start
+            if item is _DONE:
+                return
+            stage.received += 1
+            yield item
+
+    def _send(self, stage: Stage, outbox: Queue, item):
+        start = time.perf_counter()
+        while True:
+            try:
+                outbox.put(item, timeout=_POLL_INTERVAL)
+                break
+            except Full:
+                if self._stop.is_set():
+                    raise _Stopped
+        stage.blocked += time.perf_counter() - start
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import math
+from typing import Iterable, Iterator, List, NamedTuple, Set, Tuple
+
+from sqlalchemy import Column, select, func, union, bindparam, exists, or_
+
+from .bulk import chunked, insert_batched
+from .. import app, db
+from ..models import *
+
+__all__ = (
+    "SearchMatch",
+    "trigrams",
+    "similarity",
+    "index_names",
+    "index_version",
+    "find_names"
+)
+
+EXACT, PREFIX, FUZZY = 'exact', 'prefix', 'fuzzy'
+
+
+class SearchMatch(NamedTuple):
+    """A name matching a search, ordered by how well it matches."""
+    name: str
+    kind: str
+    score: float
+
+
+def trigrams(name: str) -> Set[str]:
+    """The trigrams of a lowercase name, padded so short names and prefixes have some too."""
+    padded = f'  {name.lower()} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b)
+
+
+def index_names(names: Iterable[str], fuzzy=True) -> int:
+    """Adds the names which aren't indexed yet. The caller commits the session.
+
+    Names and trigrams added concurrently by another process are skipped
+    rather than failing on the unique constraints.
+
+    :param fuzzy: Also index the trigrams of the names, so they can be found
+        by similarity. Only worth it for names chosen by people.
+    :return: The number of new names
+    """
+    conn = db.session.connection()
+    n, t = SearchNames.__table__, SearchTrigrams.__table__
+
+    new: List[str] = []
+    # Names found by prefix only so far
+    upgraded: List[str] = []
+    query = select([n.c.name, n.c.trigram_count]).where(n.c.name.in_(bindparam('names', expanding=True)))
+    for chunk in chunked(sorted(set(names)), app.config['LOOKUP_BATCH_SIZE']):
+        existing = dict(conn.execute(query, names=chunk).fetchall())
+        new.extend(name for name in chunk if name not in existing)
+        if fuzzy:
+            upgraded.extend(name for name in chunk if existing.get(name) == 0)
+    if not new and not upgraded:
+        return 0
+
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+    insert_batched(conn, n, ({'name': name, 'key': name.lower(),
+                              'trigram_count': len(trigrams(name)) if fuzzy else 0} for name in new), batch_size,
+                   ignore_conflicts=True)
+    if not fuzzy:
+        return len(new)
+
+    # Names are unique, so reading them back by name gets the rows added here or concurrently
+    query = select([n.c.id, n.c.name]).where(n.c.name.in_(bindparam('names', expanding=True)))
+    ids = []
+    for chunk in chunked(new, app.config['LOOKUP_BATCH_SIZE']):
+        ids.extend(conn.execute(query, names=chunk))
+    for chunk in chunked(upgraded, app.config['LOOKUP_BATCH_SIZE']):
+        rows = conn.execute(query, names=chunk).fetchall()
+        conn.execute(n.update().where(n.c.id == bindparam('_id')).values(trigram_count=bindparam('trigram_count')),
+                     [{'_id': nid, 'trigram_count': len(trigrams(name))} for nid, name in rows])
+        ids.extend(rows)
+    insert_batched(conn, t, ({'trigram': gram, 'name_id': nid} for nid, name in ids for gram in trigrams(name)),
+                   batch_size, ignore_conflicts=True)
+    return len(new)
+
+
+def _version_names(version: str, fuzzy: bool) -> Iterator[str]:
+    """The distinct names of a version, read with a single query.
+
+    :param fuzzy: Get the names chosen by people, which are the mcp names and
+        simple class names. Otherwise the srg and obf names.
+    """
+    if fuzzy:
+        queries = [select([Classes.simple_name]).where(Classes.version == version)]
+        queries.extend(select([t.mcp_name]).where(t.version == version) for t in (Fields, Methods, Parameters))
+    else:
+        queries = [select([getattr(t, column)]).where(t.version == version)
+                   for t in (Classes, Fields, Methods, Parameters) for column in ('srg_name', 'obf_name')]
+    for name, in db.session.execute(union(*queries)):
+        if name:
+            yield name
+
+
+def index_version(version: str) -> int:
+    """Adds the names of a version to the index. The caller commits the session."""
+    return index_names(_version_names(version, fuzzy=False), fuzzy=False) + \
+        index_names(_version_names(version, fuzzy=True))
+
+
+def _in_version(version: str, columns: List[Column]):
+    """Whether any member of the version holds the search name in one of the columns."""
+    name = SearchNames.__table__.c.name
+    return or_(*(exists().where(column.table.c.version == version).where(column == name) for column in columns))
+
+
+def _first_in_version(query, in_version, limit: int) -> List[str]:
+    """The first ``limit`` names of an ordered query which the version holds.
+    Versions share most names, so the best candidates are checked first, and
+    the others only if too few of those were in the version."""
+    n = SearchNames.__table__
+    held = select([n.c.name]).where(n.c.name.in_(bindparam('names', expanding=True))).where(in_version)
+    found: List[str] = []
+    checked = 0
+    for bound in (limit * 4, None):
+        candidates = [name for name, in db.session.execute(query.limit(bound))]
+        for chunk in chunked(candidates[checked:], app.config['LOOKUP_BATCH_SIZE']):
+            names = {name for name, in db.session.execute(held, {'names': chunk})}
+            found.extend(name for name in chunk if name in names)
+            if len(found) >= limit:
+                return found[:limit]
+        if bound is None or len(candidates) < bound:
+            break
+        checked = len(candidates)
+    return found
+
+
+def _find_prefixed(key: str, in_version, limit: int) -> List[str]:
+    n = SearchNames.__table__
+    # The range lets databases use the index on key whatever their LIKE semantics are
+    upper = key[:-1] + chr(ord(key[-1]) + 1)
+    query = select([n.c.name]) \
+        .where(n.c.key >= key).where(n.c.key < upper).where(n.c.key.startswith(key, autoescape=True)) \
+        .order_by(func.length(n.c.key), n.c.name)
+    return _first_in_version(query, in_version, limit)
+
+
+def _find_similar(grams: Set[str], in_version, limit: int) -> List[str]:
+    n, t = SearchNames.__table__, SearchTrigrams.__table__
+    min_similarity = app.config['SEARCH_MIN_SIMILARITY']
+    # Names sharing fewer trigrams than this can't be similar enough, whatever their length
+    min_shared = max(1, math.ceil(min_similarity * len(grams)))
+
+    shared = select([t.c.name_id, func.count().label('shared')]) \
+        .where(t.c.trigram.in_(sorted(grams))) \
+        .group_by(t.c.name_id).having(func.count() >= min_shared).alias('shared')
+    score = (shared.c.shared * 1.0 / (len(grams) + n.c.trigram_count - shared.c.shared)).label('score')
+    query = select([n.c.name]).select_from(shared.join(n, n.c.id == shared.c.name_id)) \
+        .where(score >= min_similarity).order_by(score.desc(), n.c.name)
+    return _first_in_version(query, in_version, limit)
+
+
+def find_names(query: str, fuzzy: bool, version: str, columns: List[Column]) -> Tuple[List[SearchMatch], bool]:
+    """Finds the names starting with the query, and with ``fuzzy`` the ones similar to it.
+    Exact matches come first, then the shortest names starting with the query, then the most similar names.
+
+    Only names held by a member of the version in one of the columns are found.
+    At most ``SEARCH_MAX_NAMES`` of each kind are returned.
+
+    :return: The matches, and whether more names matched than were returned
+    """
+    key = query.lower()
+    limit = app.config['SEARCH_MAX_NAMES']
+    grams = trigrams(key)
+    in_version = _in_version(version, columns)
+
+    # One more than the limit tells whether there are more
+    prefixed = _find_prefixed(key, in_version, limit + 1)
+    has_more = len(prefixed) > limit
+    found = {name: PREFIX for name in prefixed[:limit]}
+    if fuzzy:
+        similar = _find_similar(grams, in_version, limit + 1)
+        has_more = has_more or len(similar) > limit
+        for name in similar[:limit]:
+            found.setdefault(name, FUZZY)
+
+    matches = [SearchMatch(name, EXACT if name.lower() == key else kind, similarity(grams, trigrams(name)))
+               for name, kind in found.items()]
+    order = (EXACT, PREFIX, FUZZY)
+    matches.sort(key=lambda m: (order.index(m.kind), -m.score if m.kind == FUZZY else len(m.name), m.name))
+    return matches, has_more
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from . import dump
+from .. import app
+from ..models import Versions
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = (
+    "ENCODINGS",
+    "variant_name",
+    "snapshot_path",
+    "read_decompressed",
+    "build_snapshots",
+    "SnapshotBuilder",
+    "builder"
+)
+
+# Content-Encoding -> file extension, in order of preference
+ENCODINGS = {'zstd': 'zst', 'gzip': 'gz'} if zstandard is not None else {'gzip': 'gz'}
+
+CHUNK_SIZE = 1 << 16
+
+
+def _directory() -> str:
+    return app.config['SNAPSHOT_DIR'] or os.path.join(app.instance_path, 'snapshots')
+
+
+def variant_name(fmt: str, table: str = None, doc=True) -> str:
+    """The name of the snapshot of a dump format and its options."""
+    if fmt == 'csv':
+        return f'csv-{table}'
+    if fmt == 'json' and not doc:
+        return 'json-nodoc'
+    return fmt
+
+
+def _variants() -> Iterator[Tuple[str, Callable[[str], Iterator[str]]]]:
+    """Yields the name and body of every dump variant."""
+    yield 'json', dump.dump_json
+    yield 'json-nodoc', lambda v: dump.dump_json(v, doc=False)
+    yield 'ndjson', dump.dump_ndjson
+    for table in dump.DUMP_TABLES:
+        yield variant_name('csv', table), lambda v, t=table: dump.dump_csv(v, t)
+
+
+def snapshot_path(version: Versions, variant: str, encoding: str) -> Optional[str]:
+    """Gets the snapshot of a variant, if one was built for the current revision."""
+    path = os.path.join(_directory(), version.version, str(version.revision), f'{variant}.{ENCODINGS[encoding]}')
+    return path if os.path.exists(path) else None
+
+
+def read_decompressed(path: str) -> Iterator[bytes]:
+    """Streams a gzip snapshot to clients which don't accept any encoding."""
+    with gzip.open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _write_variant(directory: str, variant: str, body: Iterator[str]):
+    files = {ext: tempfile.NamedTemporaryFile(dir=directory, delete=False) for ext in ENCODINGS.values()}
+    try:
+        writers = [gzip.GzipFile(fileobj=files['gz'], mode='wb', compresslevel=9, mtime=0)]
+        if 'zst' in files:
+            writers.append(zstandard.ZstdCompressor(level=app.config['SNAPSHOT_ZSTD_LEVEL'])
+                           .stream_writer(files['zst'], closefd=False))
+        for chunk in body:
+            data = chunk.encode('utf-8')
+            for w in writers:
+                w.write(data)
+        for w in writers:
+            w.close()
+        for ext, f in files.items():
+            f.close()
+            os.replace(f.name, os.path.join(directory, f'{variant}.{ext}'))
+    except BaseException:
+        for f in files.values():
+            f.close()
+            if os.path.exists(f.name):
+                os.remove(f.name)
+        raise
+
+
+def build_snapshots(version: str):
+    """Writes every dump variant of the current revision of a version, then
+    removes the snapshots of older revisions. Needs an app context."""
+    v = Versions.query.filter_by(version=version).one_or_none()
+    if v is None:
+        return
+    root = os.path.join(_directory(), v.version)
+    directory = os.path.join(root, str(v.revision))
+    os.makedirs(directory, exist_ok=True)
+
+    for variant, body in _variants():
+        _write_variant(directory, variant, body(v.version))
+
+    # Another process may already be building a newer revision.
+    # Files being sent stay readable until they're closed.
+    for name in os.listdir(root):
+        if name.isdigit() and int(name) < v.revision:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class SnapshotBuilder:
+    """Rebuilds snapshots on a background thread.
+
+    A version is built once it went ``delay`` seconds without changes, so a
+    burst of renames causes a single rebuild. Steady renames can't postpone
+    it longer than ``max_delay`` seconds after the first of them.
+    """
+
+    def __init__(self, delay: float, max_delay: float):
+        self.delay = delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        # version -> (time of the first pending change, due time)
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, version: str, reset=True):
+        """Builds the snapshots of a version after the delay.
+
+        :param reset: Restart the delay if the version is already scheduled,
+            up to ``max_delay`` after it was first scheduled
+        """
+        if not app.config['SNAPSHOTS']:
+            return
+        with self._cond:
+            pending = self._pending.get(version)
+            if pending is not None and not reset:
+                return
+            now = time.monotonic()
+            first = pending[0] if pending is not None else now
+            self._pending[version] = first, min(now + self.delay, first + self.max_delay)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='snapshot-builder', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _next(self) -> str:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                for version, (_, due) in self._pending.items():
+                    if due <= now:
+                        del self._pending[version]
+                        return version
+                self._cond.wait(min(due for _, due in self._pending.values()) - now if self._pending else None)
+
+    def _run(self):
+        while True:
+            version = self._next()
+            try:
+                with app.app_context():
+                    build_snapshots(version)
+            except Exception:
+                app.logger.exception(f"Failed to build the snapshots of {version}")
+
+
+builder = SnapshotBuilder(app.config['SNAPSHOT_DELAY'], app.config['SNAPSHOT_MAX_DELAY'])
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+from sqlalchemy import select, literal, func, union_all
+
+from .. import app, db
+from ..models import *
+
+__all__ = (
+    "count_members",
+    "get_stats",
+    "refresh_stats",
+    "count_rename",
+    "count_renames"
+)
+
+
+def _counted(table: McpNamedTable, version: str):
+    """The filter of members counted by the summary.
+    Members without a srg id, other than parameters, can't be renamed."""
+    clause = table.version == version
+    if table is not Parameters:
+        clause &= table.srg_id != None
+    return clause
+
+
+def count_members(version: str) -> Dict[MemberType, Tuple[int, int]]:
+    """Counts the total and mapped members of each table in a single query."""
+    query = union_all(*(
+        select([literal(t.member_type.value), func.count(), func.count(t.last_change_id)])
+            .where(_counted(t, version))
+        for t in (Fields, Methods, Parameters)))
+    return {MemberType(mt): (total, mapped) for mt, total, mapped in db.session.execute(query)}
+
+
+def get_stats(version: str) -> Dict[MemberType, Tuple[int, int]]:
+    """Gets the total and mapped members of each table, from the statistics table if it's enabled."""
+    if app.config['SUMMARY_STATS']:
+        rows = VersionStats.query.filter_by(version=version).all()
+        if rows:
+            return {r.member_type: (r.total, r.mapped) for r in rows}
+    return count_members(version)
+
+
+def refresh_stats(version: str):
+    """Recounts the statistics of a version. The caller commits the session."""
+    if not app.config['SUMMARY_STATS']:
+        return
+    VersionStats.query.filter_by(version=version).delete()
+    for member_type, (total, mapped) in count_members(version).items():
+        db.session.add(VersionStats(version=version, member_type=member_type, total=total, mapped=mapped))
+
+
+def count_rename(member: McpNamed):
+    """Updates the statistics for a member which is about to get a name.
+    Must be called before its last change is set."""
+    if not app.config['SUMMARY_STATS']:
+        return
+    if member.last_change_id is not None:
+        return
+    if not isinstance(member, Parameters) and member.srg_id is None:
+        return
+    count_renames(member.version, member.member_type, 1)
+
+
+def count_renames(version: str, member_type: MemberType, count: int):
+    """Adds members which got their first name to the statistics."""
+    if not app.config['SUMMARY_STATS'] or not count:
+        return
+    VersionStats.query.filter_by(version=version, member_type=member_type) \
+        .update({VersionStats.mapped: VersionStats.mapped + count}, synchronize_session=False)
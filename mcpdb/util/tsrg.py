@@ -2,18 +2,20 @@ from __future__ import annotations
 
 import io
 import re
+import sys
 import zipfile
-from dataclasses import dataclass, field
-from typing import Dict, TypeVar, Generic, Optional, Iterable, List, Tuple
-
-import requests
+from functools import lru_cache
+from typing import Dict, TypeVar, Generic, Optional, Iterable, Iterator, Container, Tuple
 
+from .descriptor import Descriptor, parse_descriptor, descriptor_to_type, remap_descriptor, remap_type, CACHE_SIZE
 from .maven import *
 
 __all__ = (
     "TSrg",
     "parse",
-    "parse_descriptor"
+    "parse_descriptor",
+    "load_tsrg_mappings",
+    "read_tsrg_zip"
 )
 
 field_regex = re.compile(r'^field_(\d+)_(\w+)$')
@@ -21,10 +23,15 @@ func_regex = re.compile(r'^func_(\d+)_(\w+)$')
 param_regex = re.compile(r'^p_(\d+)_(\d+)_$')
 
 
-@dataclass
 class SrgMapping:
-    obf: str
-    srg: str
+    __slots__ = ('obf', 'srg')
+
+    def __init__(self, obf: str, srg: str):
+        self.obf = obf
+        self.srg = srg
+
+    def __repr__(self):
+        return f"{type(self).__name__}(obf={self.obf!r}, srg={self.srg!r})"
 
 
 T = TypeVar('T', bound=SrgMapping)
@@ -49,8 +56,22 @@ class SrgContainer(Generic[T], Iterable[T]):
 class TSrg:
     def __init__(self):
         self.classes: SrgContainer[TClass] = SrgContainer()
-        self.fields: Dict[str, TField] = {}
-        self.methods: Dict[str, TMethod] = {}
+        self.field_count = 0
+        self.method_count = 0
+        self.param_count = 0
+        # Remapping depends on the classes, so each instance has its own caches
+        self.descriptor = lru_cache(maxsize=CACHE_SIZE)(self._remap_descriptor)
+        self.java_type = lru_cache(maxsize=CACHE_SIZE)(self._java_type)
+
+    @property
+    def fields(self) -> Iterator[TField]:
+        for c in self.classes:
+            yield from c.fields.values()
+
+    @property
+    def methods(self) -> Iterator[TMethod]:
+        for c in self.classes:
+            yield from c.methods.values()
 
     def map_type(self, name):
         c = self.classes.by_obf.get(name)
@@ -58,68 +79,77 @@ class TSrg:
             return name
         return c.srg
 
-    def descriptor(self, desc: Tuple[List[str], str]):
-        args, ret = desc
+    def _remap_descriptor(self, signature: str) -> str:
+        """Maps an obf method signature to an srg signature. Cached as ``descriptor``."""
+        return remap_descriptor(parse_descriptor(signature), self.map_type)
 
-        def map_param(name):
-            if name[0] == 'L':
-                return f"L{self.map_type(name[1:-1])};"
-            return name
-
-        return f"({''.join(map_param(p) for p in args)}){map_param(ret)}"
+    def _java_type(self, desc: str) -> str:
+        """Maps an obf type descriptor to a dotted srg java type. Cached as ``java_type``."""
+        return descriptor_to_type(remap_type(desc, self.map_type)).replace('/', '.')
 
 
-@dataclass
 class TClass(SrgMapping):
-    fields: Dict[str, TField] = field(default_factory=dict)
-    constructors: Dict[int, TConstructor] = field(default_factory=dict)
-    methods: Dict[str, TMethod] = field(default_factory=dict)
+    __slots__ = ('fields', 'constructors', 'methods')
+
+    def __init__(self, obf: str, srg: str):
+        super().__init__(obf, srg)
+        self.fields: Dict[str, TField] = {}
+        self.constructors: Dict[int, TConstructor] = {}
+        self.methods: Dict[str, TMethod] = {}
 
     def add_constructor(self, c_id, owner, signature):
         self.constructors[c_id] = TConstructor(c_id, owner, parse_descriptor(signature))
 
 
-@dataclass
 class TField(SrgMapping):
-    owner: TClass
+    __slots__ = ('owner', 'srg_id')
 
-    @property
-    def srg_id(self):
-        m = field_regex.match(self.srg)
-        return int(m.group(1)) if m else None
+    def __init__(self, obf: str, srg: str, owner: TClass):
+        super().__init__(obf, srg)
+        self.owner = owner
+        m = field_regex.match(srg)
+        self.srg_id: Optional[int] = int(m.group(1)) if m else None
 
 
-@dataclass
 class TConstructor:
-    srg_id: int
-    owner: TClass
-    sig: Tuple[List[str], str]
+    __slots__ = ('srg_id', 'owner', 'sig')
+
+    def __init__(self, srg_id: int, owner: TClass, sig: Descriptor):
+        self.srg_id = srg_id
+        self.owner = owner
+        self.sig = sig
 
 
-@dataclass
 class TMethod(SrgMapping):
-    desc: Tuple[List[str], str]
-    owner: TClass
-    static: bool = False
+    __slots__ = ('sig', 'desc', 'owner', 'static', 'srg_id', 'params')
 
-    @property
-    def srg_id(self):
-        m = func_regex.match(self.srg)
-        return int(m.group(1)) if m else None
+    def __init__(self, obf: str, srg: str, sig: str, owner: TClass, static=False):
+        super().__init__(obf, srg)
+        # Interned, so methods with the same signature share it
+        self.sig = sys.intern(sig)
+        self.desc = parse_descriptor(sig)
+        self.owner = owner
+        self.static = static
+        m = func_regex.match(srg)
+        self.srg_id: Optional[int] = int(m.group(1)) if m else None
 
-    @property
-    def params(self):
-        start = 0 if self.static else 1
-        end = start + len(self.desc[0])
-        sid = self.srg_id
-        sid = sid if sid is not None else self.obf
-        return [f'p_{sid}_{n}_' for n in range(start, end)]
+        # The srg names of the parameters. Static methods don't have 'this' as parameter 0.
+        start = 0 if static else 1
+        sid = self.srg_id if self.srg_id is not None else obf
+        self.params: Tuple[str, ...] = tuple(f'p_{sid}_{n}_' for n in range(start, start + len(self.desc[0])))
 
 
-def parse(tsrg_stream: Iterable[str]) -> TSrg:
+def parse(tsrg_stream: Iterable[str], static_methods: Container[str] = frozenset()) -> TSrg:
+    """Parses tsrg lines as they are read.
+
+    :param static_methods: The srg names of the static methods
+    """
     tsrg = TSrg()
     current_class: Optional[TClass] = None
     for line in tsrg_stream:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
         if not line.startswith('\t'):
             # Classes
             obf, srg = line.split(' ')
@@ -128,64 +158,40 @@ def parse(tsrg_stream: Iterable[str]) -> TSrg:
         elif '(' in line:
             # Methods
             obf, sig, srg = line.strip().split(' ')
-            m = TMethod(obf, srg, parse_descriptor(sig), current_class)
+            m = TMethod(obf, srg, sig, current_class, srg in static_methods)
             current_class.methods[srg] = m
-            tsrg.methods[srg] = m
+            tsrg.method_count += 1
+            tsrg.param_count += len(m.params)
         else:
             # Fields
             obf, srg = line.strip().split(' ')
-            f = TField(obf, srg, current_class)
-            current_class.fields[srg] = f
-            tsrg.fields[srg] = f
+            current_class.fields[srg] = TField(obf, srg, current_class)
+            tsrg.field_count += 1
 
     return tsrg
 
 
-def parse_descriptor(signature) -> Tuple[List[str], str]:
-    args, ret = re.match(r'\((.*)\)(.*)', signature).groups()
-    targs = []
-    array = 0
-    current_type: Optional[List[str]] = None
-    for c in args:
-        if current_type is None and c == '[':
-            array += 1
-        elif current_type is None:
-            if c == 'L':
-                current_type = [c]
-            else:
-                if array:
-                    c = '[' * array + c
-                    array = 0
-                targs.append(c)
-        else:
-            current_type.append(c)
-            if c == ';':
-                joined = ''.join(current_type)
-                if array:
-                    joined = '[' * array + joined
-                    array = 0
-                targs.append(joined)
-                current_type = None
-
-    return targs, ret
+def load_tsrg_mappings(artifact: MavenArtifact):
+    return read_tsrg_zip(artifact.download())
 
 
-def load_tsrg_mappings(artifact: MavenArtifact):
-    with requests.get(artifact.path) as resp:
-        zipbytes = io.BytesIO(resp.content)
+def read_tsrg_zip(file) -> TSrg:
+    """Reads the mappings of an mcp_config zip.
+    The tsrg file is parsed line by line as it's decompressed.
 
-        with zipfile.ZipFile(zipbytes, 'r') as z:
-            joined = z.read('config/joined.tsrg').decode('utf-8').splitlines()
-            ts = parse(joined)
+    :param file: A path or file object
+    """
+    with zipfile.ZipFile(file, 'r') as z:
+        with z.open('config/static_methods.txt') as f:
+            static_methods = frozenset(line.strip() for line in io.TextIOWrapper(f, 'utf-8'))
 
-            static_methods = z.read('config/static_methods.txt').decode('utf-8').splitlines()
-            for func in static_methods:
-                ts.methods[func].static = True
+        with z.open('config/joined.tsrg') as f:
+            ts = parse(io.TextIOWrapper(f, 'utf-8'), static_methods)
 
-            constructors = z.read('config/constructors.txt').decode('utf-8').splitlines()
-            for c in constructors:
-                c_id, owner, sig = c.split(' ')
+        with z.open('config/constructors.txt') as f:
+            for c in io.TextIOWrapper(f, 'utf-8'):
+                c_id, owner, sig = c.split()
                 if owner in ts.classes.by_srg:
-                    ts.classes.by_srg[owner].add_constructor(*c.split(' '))
+                    ts.classes.by_srg[owner].add_constructor(int(c_id), owner, sig)
 
-            return ts
+        return ts
@@ -17,5 +17,8 @@ setup(
         'requests',
         'click',
         'itsdangerous'
-    ]
+    ],
+    extras_require={
+        'zstd': ['zstandard']
+    }
 )
@@ -0,0 +1,132 @@
+"""Imports mcp_config zips with flask import-tsrg into a temporary database.
+
+Run from the repository root with ``python -m unittest``. Importing mcpdb
+needs the instance config, like the app itself.
+"""
+import os
+import tempfile
+import unittest
+import zipfile
+
+from mcpdb import app, db
+from mcpdb.cli import bulk_import_tsrg_mappings
+from mcpdb.models import *
+from mcpdb.util.tsrg import read_tsrg_zip
+
+BASE_TSRG = """\
+a net/minecraft/A
+\ta field_1_a
+\tb field_2_b
+\ta (I)V func_10_a
+\tb (Lb;)Lb; func_11_a
+\tc (IJ)V func_12_a
+\tequals (Ljava/lang/Object;)Z equals
+b net/minecraft/B
+\ta field_3_a
+\ta (Lb;J)V func_13_a
+c net/minecraft/C
+\ta field_4_a
+\ta ()V func_14_a
+"""
+
+# A's first field and B's obf name changed, func_11_a has a new signature,
+# func_12_a became static, C was removed and D added.
+NEW_TSRG = """\
+a net/minecraft/A
+\tc field_1_a
+\tb field_2_b
+\ta (I)V func_10_a
+\tb (Ld;I)Ld; func_11_a
+\tc (IJ)V func_12_a
+\tequals (Ljava/lang/Object;)Z equals
+d net/minecraft/B
+\ta field_3_a
+\ta (Ld;J)V func_13_a
+e net/minecraft/D
+\ta field_5_a
+\ta (Ljava/lang/String;)V func_15_a
+"""
+
+
+def _write_config(path, tsrg, static_methods=()):
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('config/joined.tsrg', tsrg)
+        z.writestr('config/static_methods.txt', ''.join(f'{name}\n' for name in static_methods))
+        z.writestr('config/constructors.txt', '')
+
+
+def _rows(version):
+    """The rows of a version without ids, with owners given by srg name."""
+    classes = {c.id: c.srg_name for c in Classes.query.filter_by(version=version)}
+    methods = {m.id: (classes[m.class_id], m.srg_name) for m in Methods.query.filter_by(version=version)}
+    return {
+        'classes': sorted((c.obf_name, c.srg_name, c.package, c.simple_name)
+                          for c in Classes.query.filter_by(version=version)),
+        'fields': sorted((classes[f.class_id], f.obf_name, f.srg_name, f.srg_id, f.locked)
+                         for f in Fields.query.filter_by(version=version)),
+        'methods': sorted((classes[m.class_id], m.obf_name, m.srg_name, m.srg_id, m.locked, m.descriptor)
+                          for m in Methods.query.filter_by(version=version)),
+        'params': sorted(methods[p.method_id] + (p.obf_name, p.srg_name, p.index, p.type, p.locked)
+                         for p in Parameters.query.filter_by(version=version))
+    }
+
+
+class ImportTsrgTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.dir.name, 'base.zip')
+        self.new = os.path.join(self.dir.name, 'new.zip')
+        _write_config(self.base, BASE_TSRG)
+        _write_config(self.new, NEW_TSRG, ['func_12_a'])
+
+        self.config = {k: app.config[k] for k in ('SQLALCHEMY_DATABASE_URI', 'SNAPSHOTS')}
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(self.dir.name, 'test.sqlite')
+        app.config['SNAPSHOTS'] = False
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        self.runner = app.test_cli_runner()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.context.pop()
+        app.config.update(self.config)
+        self.dir.cleanup()
+
+    def import_tsrg(self, *args):
+        return self.runner.invoke(args=['import-tsrg', *args])
+
+    def test_delta_matches_full_import(self):
+        self.assertEqual(self.import_tsrg('1.0', '--zip', self.base).exit_code, 0)
+        self.assertEqual(self.import_tsrg('1.1', '--zip', self.new, '--base', '1.0').exit_code, 0)
+        self.assertEqual(self.import_tsrg('1.1-full', '--zip', self.new).exit_code, 0)
+
+        delta, full = _rows('1.1'), _rows('1.1-full')
+        for table in full:
+            self.assertTrue(full[table], table)
+            self.assertEqual(delta[table], full[table], table)
+
+    def test_rows_of_interrupted_import_are_replaced(self):
+        # The bulk writer commits on its own, as if the command was killed right after it
+        bulk_import_tsrg_mappings('1.0', read_tsrg_zip(self.base))
+        db.session.rollback()
+        self.assertIsNone(Versions.query.filter_by(version='1.0').one_or_none())
+
+        result = self.import_tsrg('1.0', '--zip', self.base)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("interrupted import", result.output)
+        self.assertEqual(Classes.query.filter_by(version='1.0').count(), 3)
+        self.assertEqual(Methods.query.filter_by(version='1.0').count(), 6)
+
+    def test_unknown_base(self):
+        self.assertEqual(self.import_tsrg('1.0', '--zip', self.base).exit_code, 0)
+        result = self.import_tsrg('1.1', '--zip', self.new, '--base', '1.O')
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("No such version", result.output)
+        self.assertIsNone(Versions.query.filter_by(version='1.1').one_or_none())
+        self.assertEqual(Classes.query.filter_by(version='1.1').count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()